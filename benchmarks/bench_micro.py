@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# bench_micro.py
+#
+# Microbenchmarks of the hot paths behind /data: parsing one CSV line, the
+# address sort of the client table, the per-snapshot view orders, the
+# hostname cache and the JSON serialization of a response:
+#
+#   python3 benchmarks/bench_micro.py                   # 1k, 10k, 100k clients
+#   python3 benchmarks/bench_micro.py --sizes 20000 --json micro.json
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from synth import chronyc_csv  # noqa: E402
+
+app = importlib.import_module("ticc-dash")
+
+
+def best_of(fn, repeat, setup=None):
+    """Fastest of ``repeat`` runs of fn(setup()); setup is not timed."""
+    best = float("inf")
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_size(n, repeat):
+    lines = chronyc_csv(n).splitlines()
+    rows = app.parse_chronyc_csv("\n".join(lines))
+    shuffled = rows[:]
+    random.Random(0).shuffle(shuffled)
+    app.stamp_last_seen(rows, time.time())
+    for row in rows:
+        row["severity"] = app.severity(row)
+
+    def parse_lines(_):
+        parse = app._parse_client_line
+        for ln in lines:
+            parse(ln)
+
+    def sort_rows(rs):
+        key = app._client_sort_key
+        rs.sort(key=lambda r: key(r["addr"]))
+
+    def view_order(mode):
+        return lambda snap: snap.order(mode)
+
+    def fresh_snapshot():
+        return app.Snapshot(rows, len(rows), "", time.time(), "bench", 1)
+
+    def select_query(snap):
+        snap.select("ip_order", "10.0.1")
+
+    # A resolver whose cache already holds every address, as after the first polls.
+    resolver = app.HostnameResolver(lambda addr: None, max_entries=2 * n)
+    resolver._cache.update((r["addr"], ("host.example", float("inf"))) for r in rows)
+
+    def annotate_hostnames(rs):
+        resolver.annotate(rs)
+
+    page = {"count": n, "version": 1, "clients_parsed": rows[:100], "filtered": n, "offset": 0,
+            "summary": {"ok": 0, "warning": 0, "critical": 0}}
+    full = dict(page, clients_parsed=rows)
+
+    def jsonify(payload):
+        def run(_):
+            with app.app.app_context():
+                app.jsonify(payload).get_data()
+        return run
+
+    def dumps(payload):
+        return lambda _: json.dumps(payload, separators=(",", ":"))
+
+    cases = [
+        ("parse_client_line", n, parse_lines, None),
+        ("parse_chronyc_csv", n, lambda _: app.parse_chronyc_csv("\n".join(lines)), None),
+        ("sort_clients", n, sort_rows, lambda: shuffled[:]),
+        ("order_ip_order", n, view_order("ip_order"), fresh_snapshot),
+        ("order_drop_desc", n, view_order("drop_desc"), fresh_snapshot),
+        ("order_last_recent", n, view_order("last_recent"), fresh_snapshot),
+        ("select_search", n, select_query, fresh_snapshot),
+        ("resolver_annotate", n, annotate_hostnames, lambda: [dict(r) for r in rows]),
+        ("jsonify_page_100", 100, jsonify(page), None),
+        ("jsonify_full", n, jsonify(full), None),
+        ("json_dumps_full", n, dumps(full), None),
+    ]
+    results = []
+    for name, items, fn, setup in cases:
+        best = best_of(fn, repeat, setup)
+        results.append({"name": name, "clients": n, "items": items, "best_s": best,
+                        "per_item_ns": best / items * 1e9 if items else None})
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Microbenchmarks of parsing, sorting and serialization")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    results = []
+    print(f"{'benchmark':<20}  {'clients':>8}  {'best':>11}  {'per item':>10}")
+    for n in args.sizes:
+        for r in bench_size(n, args.repeat):
+            results.append(r)
+            print(f"{r['name']:<20}  {r['clients']:>8}  {r['best_s'] * 1e3:>9.3f}ms  {r['per_item_ns']:>8.0f}ns")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"benchmark": "micro", "python": platform.python_version(), "repeat": args.repeat,
+                       "results": results}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
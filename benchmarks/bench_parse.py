@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# bench_parse.py
+#
+# Compare the original `chronyc clients` text parser (split + three-way sort)
+# with the typed `chronyc -c clients` parser on synthetic tables:
+#
+#   python3 benchmarks/bench_parse.py                  # 1k, 10k, 100k lines
+#   python3 benchmarks/bench_parse.py --sizes 5000 --json parse.json
+import argparse
+import importlib
+import json
+import os
+import socket
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from synth import chronyc_csv, chronyc_text  # noqa: E402
+
+app = importlib.import_module("ticc-dash")
+
+
+# --- Reference: the text parser as it was before the CSV path ---------------
+
+def _is_ipv4(addr):
+    try:
+        socket.inet_pton(socket.AF_INET, addr)
+        return True
+    except OSError:
+        return False
+
+
+def _is_ipv6(addr):
+    try:
+        socket.inet_pton(socket.AF_INET6, addr)
+        return True
+    except OSError:
+        return False
+
+
+def _legacy_parse_line(line):
+    parts = line.split()
+    if not parts:
+        return None
+    f = parts[1:]
+    def g(i): return f[i] if i < len(f) else ""
+    return {"addr": parts[0], "NTP": g(0), "Drop": g(1), "Int": g(2), "IntL": g(3), "Last": g(4), "Cmd": g(5)}
+
+
+def legacy_parse(output):
+    lines = output.strip().split("\n")
+    body = [ln.rstrip() for ln in lines[2:] if ln.strip() != ""]
+    hostnames, ipv4s, ipv6s = [], [], []
+    for ln in body:
+        addr = (ln.split() or [""])[0]
+        if _is_ipv4(addr):
+            ipv4s.append(ln)
+        elif _is_ipv6(addr):
+            ipv6s.append(ln)
+        else:
+            hostnames.append(ln)
+    hostnames.sort(key=lambda x: x.split()[0].lower())
+    ipv4s.sort(key=lambda x: tuple(map(int, (x.split()[0]).split("."))))
+    ipv6s.sort(key=lambda x: x.split()[0])
+    return [r for r in map(_legacy_parse_line, hostnames + ipv4s + ipv6s) if r]
+
+
+# -----------------------------------------------------------------------------
+
+def best_of(fn, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(sizes, repeat):
+    results = []
+    for n in sizes:
+        text, csv = chronyc_text(n), chronyc_csv(n)
+        legacy = best_of(legacy_parse, text, repeat)
+        typed = best_of(app.parse_chronyc_csv, csv, repeat)
+        results.append({
+            "lines": n,
+            "legacy_text_s": legacy,
+            "typed_csv_s": typed,
+            "speedup": legacy / typed if typed else None,
+        })
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare the chronyc text parser with the typed CSV parser")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    print(f"{'lines':>8}  {'legacy text':>12}  {'typed csv':>12}  {'speedup':>8}")
+    for r in results:
+        print(f"{r['lines']:>8}  {r['legacy_text_s'] * 1e3:>10.2f}ms  {r['typed_csv_s'] * 1e3:>10.2f}ms  {r['speedup']:>7.2f}x")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"benchmark": "parse", "repeat": args.repeat, "results": results}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
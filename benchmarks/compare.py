@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# compare.py
+#
+# Compare two result files of the same benchmark (bench_parse, bench_micro
+# or loadtest --json), e.g. before and after a change:
+#
+#   python3 benchmarks/compare.py before.json after.json
+import argparse
+import json
+
+# Per benchmark: what identifies a result, and the metrics to compare
+# (True when lower is better).
+METRICS = {
+    "parse": (("lines",), {"typed_csv_s": True}),
+    "micro": (("name", "clients"), {"best_s": True}),
+    "load": (("path", "concurrency"), {"throughput_rps": False, "p50_ms": True, "p95_ms": True, "p99_ms": True}),
+}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare two benchmark result files")
+    ap.add_argument("before")
+    ap.add_argument("after")
+    args = ap.parse_args()
+
+    with open(args.before) as fh:
+        before = json.load(fh)
+    with open(args.after) as fh:
+        after = json.load(fh)
+    kind = before.get("benchmark")
+    if kind != after.get("benchmark") or kind not in METRICS:
+        raise SystemExit("both files must come from the same benchmark")
+    keys, metrics = METRICS[kind]
+
+    old = {tuple(r[k] for k in keys): r for r in before["results"]}
+    print(f"{'result':<44}  {'metric':<15}  {'before':>12}  {'after':>12}  {'change':>8}")
+    for r in after["results"]:
+        ident = tuple(r[k] for k in keys)
+        prev = old.get(ident)
+        if prev is None:
+            continue
+        for metric, lower_is_better in metrics.items():
+            a, b = prev.get(metric), r.get(metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a * 100
+            better = change < 0 if lower_is_better else change > 0
+            mark = "" if abs(change) < 1 else (" +" if better else " -")
+            print(f"{' '.join(map(str, ident)):<44}  {metric:<15}  {a:>12.4g}  {b:>12.4g}  {change:>+7.1f}%{mark}")
+
+
+if __name__ == "__main__":
+    main()
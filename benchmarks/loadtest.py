@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# loadtest.py
+#
+# Local load test of the HTTP endpoints. Starts the dashboard in a separate
+# process with `chronyc` (and `sudo`) replaced by a stub that prints a
+# synthetic client table, hits every path with concurrent keep-alive
+# clients for a fixed time and reports latency percentiles and throughput:
+#
+#   python3 benchmarks/loadtest.py                      # 10k clients, 16 threads, 10 s per path
+#   python3 benchmarks/loadtest.py --server uvicorn     # the ASGI app
+#   python3 benchmarks/loadtest.py --clients 50000 --concurrency 64 --paths /data "/data?limit=100" \
+#       --server gunicorn --json load.json
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+from synth import chronyc_csv  # noqa: E402
+
+# The synthetic table as chronyd would report it $TICC_STUB_T0 seconds later:
+# a client with an interval sends a packet every 2^Int seconds (Last wraps,
+# NTP grows), the others only age.
+STUB_CHRONYC = r"""#!/bin/sh
+exec awk -F, -v OFS=, -v t="$(( $(date +%s) - TICC_STUB_T0 ))" '
+$6 != "-" { if ($4 != "-") { p = 2 ^ $4; a = $6 % p + t; $2 += int(a / p); $6 = a % p } else $6 += t }
+{ print }' "$TICC_STUB_CSV"
+"""
+STUB_SUDO = '#!/bin/sh\nexec "$@"\n'
+
+WERKZEUG_SERVER = (
+    "import importlib, sys; sys.path.insert(0, sys.argv[1]);"
+    "from werkzeug.serving import run_simple;"
+    "run_simple(sys.argv[2], int(sys.argv[3]), importlib.import_module('ticc-dash').app, threaded=True)"
+)
+
+
+def write_stubs(workdir, clients, seed):
+    csv_path = os.path.join(workdir, "clients.csv")
+    with open(csv_path, "w") as fh:
+        fh.write(chronyc_csv(clients, seed))
+    bindir = os.path.join(workdir, "bin")
+    os.mkdir(bindir)
+    for name, body in (("chronyc", STUB_CHRONYC), ("sudo", STUB_SUDO)):
+        path = os.path.join(bindir, name)
+        with open(path, "w") as fh:
+            fh.write(body)
+        os.chmod(path, 0o755)
+    return csv_path, bindir
+
+
+def start_server(args, workdir):
+    csv_path, bindir = write_stubs(workdir, args.clients, args.seed)
+    env = dict(os.environ,
+               PATH=bindir + os.pathsep + os.environ.get("PATH", ""),
+               TICC_STUB_CSV=csv_path,
+               TICC_STUB_T0=str(int(time.time())),
+               TICC_BACKEND="chronyc",
+               TICC_STATE_DIR=os.path.join(workdir, "state"),
+               TICC_POLL_INTERVAL=str(args.poll_interval))
+    env.pop("TICC_SERVERS", None)
+    if args.server == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "--worker-class", "gthread", "--threads", str(args.threads),
+               "--workers", str(args.workers), "--bind", f"{args.host}:{args.port}", "--chdir", ROOT,
+               "ticc-dash:app"]
+    elif args.server == "uvicorn":
+        cmd = [sys.executable, "-m", "uvicorn", "--app-dir", ROOT, "--host", args.host, "--port", str(args.port),
+               "--log-level", "warning", "ticc-dash:asgi_app"]
+    else:
+        cmd = [sys.executable, "-c", WERKZEUG_SERVER, ROOT, args.host, str(args.port)]
+    return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(host, port, proc, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with status {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=5)
+            conn.request("GET", "/data?limit=1")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not come up")
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile.
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[k]
+
+
+def run_path(host, port, path, concurrency, duration, revalidate):
+    latencies, statuses, sizes, errors = [], {}, [], [0]
+    lock = threading.Lock()
+    start = threading.Barrier(concurrency + 1)
+
+    def worker():
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        mine, mine_status, mine_sizes, etag = [], {}, [], None
+        start.wait()
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            headers = {"If-None-Match": etag} if revalidate and etag else {}
+            t0 = time.perf_counter()
+            try:
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                with lock:
+                    errors[0] += 1
+                continue
+            mine.append(time.perf_counter() - t0)
+            mine_status[resp.status] = mine_status.get(resp.status, 0) + 1
+            mine_sizes.append(len(body))
+            etag = resp.getheader("ETag") or etag
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            sizes.extend(mine_sizes)
+            for code, n in mine_status.items():
+                statuses[code] = statuses.get(code, 0) + n
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    start.wait()
+    t0 = time.monotonic()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - t0
+
+    latencies.sort()
+    ms = lambda v: None if v is None else v * 1e3
+    return {
+        "path": path,
+        "concurrency": concurrency,
+        "duration_s": elapsed,
+        "requests": len(latencies),
+        "errors": errors[0],
+        "status": {str(k): v for k, v in sorted(statuses.items())},
+        "throughput_rps": len(latencies) / elapsed if elapsed else None,
+        "mean_bytes": sum(sizes) / len(sizes) if sizes else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load test /data and / against a stubbed chronyc")
+    ap.add_argument("--clients", type=int, default=10000, help="size of the stubbed client table")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--paths", nargs="+", default=["/data", "/data?sort=drop_desc&limit=100", "/"])
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per path")
+    ap.add_argument("--revalidate", action="store_true",
+                    help="send If-None-Match with the last ETag, like the dashboard does")
+    ap.add_argument("--server", choices=("werkzeug", "gunicorn", "uvicorn"), default="werkzeug")
+    ap.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    ap.add_argument("--threads", type=int, default=32, help="gunicorn threads per worker")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5055)
+    ap.add_argument("--poll-interval", type=float, default=1.0)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ticc-load-")
+    proc = start_server(args, workdir)
+    try:
+        wait_ready(args.host, args.port, proc)
+        results = []
+        print(f"{'path':<36}  {'req/s':>9}  {'p50':>9}  {'p95':>9}  {'p99':>9}  {'304':>5}  {'errors':>6}")
+        for path in args.paths:
+            run_path(args.host, args.port, path, min(args.concurrency, 4), min(1.0, args.duration), False)  # warm-up
+            r = run_path(args.host, args.port, path, args.concurrency, args.duration, args.revalidate)
+            results.append(r)
+            fmt = lambda v: "-" if v is None else f"{v:.2f}ms"
+            not_modified = r["status"].get("304", 0) / r["requests"] if r["requests"] else 0.0
+            print(f"{path:<36}  {r['throughput_rps']:>9.1f}  {fmt(r['p50_ms']):>9}  {fmt(r['p95_ms']):>9}  "
+                  f"{fmt(r['p99_ms']):>9}  {not_modified:>5.0%}  {r['errors']:>6}")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"benchmark": "load", "python": platform.python_version(), "server": args.server,
+                       "clients": args.clients, "revalidate": args.revalidate, "results": results}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# synth.py
+#
+# Synthetic `chronyc clients` output for benchmarks: a deterministic mix of
+# hostnames, IPv4 and IPv6 clients, in chronyc's table and CSV (-c) formats:
+#
+#   python3 benchmarks/synth.py 10000 --csv > clients.csv
+import argparse
+import random
+import sys
+
+HEADER = (
+    "Hostname                      NTP   Drop Int IntL Last     Cmd   Drop Int  Last\n"
+    "===============================================================================\n"
+)
+
+
+def _human_seconds(s):
+    # Same rendering as chronyc's print_seconds().
+    if s < 1200:
+        return str(s)
+    if s < 36000:
+        return f"{s // 60}m"
+    if s < 345600:
+        return f"{s // 3600}h"
+    return f"{s // 86400}d"
+
+
+def synth_records(n, seed=0, hostnames=0.1, ipv6=0.2):
+    """Yield ``n`` (addr, ntp, drop, int, intl, last, cmd) tuples; None means "-"."""
+    rnd = random.Random(seed)
+    for i in range(n):
+        r = rnd.random()
+        if r < hostnames:
+            addr = f"host-{rnd.randrange(1 << 30):x}.example.net"
+        elif r < hostnames + ipv6:
+            addr = f"2001:db8:{i >> 16:x}:{i & 0xffff:x}::{rnd.randrange(1, 0xffff):x}"
+        else:
+            addr = f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+        yield (
+            addr,
+            rnd.randint(1, 100000),
+            rnd.choice((0, 0, 0, 0, 1, 3, 12)),
+            rnd.choice((None, 4, 6, 8, 10)),
+            None,
+            rnd.choice((None, rnd.randint(0, 400000))),
+            rnd.choice((0, 0, 0, 2)),
+        )
+
+
+def chronyc_text(n, seed=0, **mix):
+    """Output of `chronyc clients` with ``n`` clients."""
+    out = [HEADER]
+    for addr, ntp, drop, intv, intl, last, cmd in synth_records(n, seed, **mix):
+        d = lambda v: "-" if v is None else str(v)
+        last_s = "-" if last is None else _human_seconds(last)
+        out.append(f"{addr:<25s}  {ntp:6d}  {drop:5d}  {d(intv):>3s}  {d(intl):>3s}  {last_s:>4s}  {cmd:6d}      0    -     -\n")
+    return "".join(out)
+
+
+def chronyc_csv(n, seed=0, **mix):
+    """Output of `chronyc -c clients` with ``n`` clients."""
+    out = []
+    for addr, ntp, drop, intv, intl, last, cmd in synth_records(n, seed, **mix):
+        d = lambda v: "-" if v is None else str(v)
+        out.append(f"{addr},{ntp},{drop},{d(intv)},{d(intl)},{d(last)},{cmd},0,-,-\n")
+    return "".join(out)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Print synthetic `chronyc clients` output")
+    ap.add_argument("clients", type=int)
+    ap.add_argument("--csv", action="store_true", help="CSV format, like `chronyc -c clients`")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--hostnames", type=float, default=0.1, help="share of hostname clients")
+    ap.add_argument("--ipv6", type=float, default=0.2, help="share of IPv6 clients")
+    args = ap.parse_args()
+    render = chronyc_csv if args.csv else chronyc_text
+    sys.stdout.write(render(args.clients, args.seed, hostnames=args.hostnames, ipv6=args.ipv6))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,10 @@
 #  TICC-DASH Installer
 #  - Installs into /opt/ticc-dash
 #  - Uses current user
-#  - Creates venv and installs Flask + Gunicorn
-#  - Downloads ticc-dash.py + logo from GitHub
+#  - Runs the service as chrony's user (reads chronyd's command socket),
+#    or as the current user with a sudo rule for chronyc
+#  - Creates venv and installs Flask + Uvicorn (or Gunicorn, SERVER_MODE=gthread)
+#  - Downloads ticc-dash.py, logo + vendored Bootstrap/jQuery from GitHub
 #  - Sets up and enables a systemd service
 # ==========================================
 
@@ -16,13 +18,43 @@ VENV_DIR="$APP_DIR/venv"
 SERVICE_NAME="ticc-dash.service"
 SERVICE_FILE="/etc/systemd/system/$SERVICE_NAME"
 SUDOERS_FILE="/etc/sudoers.d/ticc-dash"
+# chronyd's command socket lives here; the dashboard binds its reply socket
+# next to it, so the service runs as the directory's owner (chrony's user)
+CHRONY_RUN_DIR="/run/chrony"
+# How the service runs the app: "asgi" (uvicorn on asyncio, ticc-dash:asgi_app)
+# or "gthread" (gunicorn threads, ticc-dash:app)
+SERVER_MODE="${SERVER_MODE:-asgi}"
+# gthread only: every open dashboard holds one thread for its /stream
+# connection, so at most GUNICORN_WORKERS x GUNICORN_THREADS viewers (less
+# what /data and /metrics need) can be served at once
+GUNICORN_WORKERS="${GUNICORN_WORKERS:-2}"
+GUNICORN_THREADS="${GUNICORN_THREADS:-200}"
 
 # Sources in repo
 REPO_RAW_PY="https://raw.githubusercontent.com/anoniemerd/ticc-dash/main/ticc-dash.py"
 REPO_RAW_LOGO="https://raw.githubusercontent.com/anoniemerd/ticc-dash/main/static/img/ticc-dash-logo.png"
+REPO_RAW_VENDOR="https://raw.githubusercontent.com/anoniemerd/ticc-dash/main/static/vendor"
+VENDOR_FILES="bootstrap.min.css jquery.min.js"
 
 USER_NAME="$(whoami)"
 
+case "$SERVER_MODE" in
+  asgi)
+    SERVER_PACKAGE="uvicorn"
+    APP_OBJECT="ticc-dash:asgi_app"
+    EXEC_START="$VENV_DIR/bin/uvicorn --app-dir $APP_DIR --host 0.0.0.0 --port 5000 --timeout-graceful-shutdown 5 $APP_OBJECT"
+    ;;
+  gthread)
+    SERVER_PACKAGE="gunicorn"
+    APP_OBJECT="ticc-dash:app"
+    EXEC_START="$VENV_DIR/bin/gunicorn --worker-class gthread --workers $GUNICORN_WORKERS --threads $GUNICORN_THREADS --bind 0.0.0.0:5000 $APP_OBJECT"
+    ;;
+  *)
+    echo "❌ SERVER_MODE must be asgi or gthread (got '$SERVER_MODE')."
+    exit 1
+    ;;
+esac
+
 log()  { printf "\n\033[1;34m%s\033[0m\n" "$*"; }
 ok()   { printf "\033[1;32m%s\033[0m\n" "$*"; }
 warn() { printf "\n\033[1;33m%s\033[0m\n" "$*"; }
@@ -40,20 +72,31 @@ run "sudo apt update -y"
 run "sudo apt install -y python3 python3-venv python3-pip chrony nginx curl"
 ok "✅ Dependencies installed."
 
-# 2) Sudo for chronyc
-log "🔐 Configuring sudo permission for chronyc..."
-if sudo test -f "$SUDOERS_FILE" && sudo grep -q "/usr/bin/chronyc" "$SUDOERS_FILE"; then
-  ok "✅ Sudo rule already exists."
+# 2) Access to chronyd
+log "🔐 Configuring access to chronyd..."
+CHRONY_USER="$(stat -c %U "$CHRONY_RUN_DIR" 2>/dev/null || true)"
+if [ -n "$CHRONY_USER" ] && [ "$CHRONY_USER" != "root" ] && [ "$CHRONY_USER" != "UNKNOWN" ]; then
+  # Read the command socket directly: no sudo, no chronyc processes.
+  SERVICE_USER="$CHRONY_USER"
+  CHRONY_BACKEND="socket"
+  ok "✅ The service will run as '$SERVICE_USER' and read chronyd's command socket."
 else
-  run "echo '$USER_NAME ALL=(ALL) NOPASSWD: /usr/bin/chronyc' | sudo tee '$SUDOERS_FILE' >/dev/null"
-  run "sudo chmod 440 '$SUDOERS_FILE'"
-  run "sudo visudo -c"
-  ok "✅ Sudo rule added."
+  SERVICE_USER="$USER_NAME"
+  CHRONY_BACKEND="auto"
+  warn "ℹ️  $CHRONY_RUN_DIR not found, falling back to sudo chronyc."
+  if sudo test -f "$SUDOERS_FILE" && sudo grep -q "/usr/bin/chronyc" "$SUDOERS_FILE"; then
+    ok "✅ Sudo rule already exists."
+  else
+    run "echo '$USER_NAME ALL=(ALL) NOPASSWD: /usr/bin/chronyc' | sudo tee '$SUDOERS_FILE' >/dev/null"
+    run "sudo chmod 440 '$SUDOERS_FILE'"
+    run "sudo visudo -c"
+    ok "✅ Sudo rule added."
+  fi
 fi
 
 # 3) Project dir
 log "📁 Creating project directory at $APP_DIR..."
-run "sudo mkdir -p '$APP_DIR/static/img'"
+run "sudo mkdir -p '$APP_DIR/static/img' '$APP_DIR/static/vendor'"
 run "sudo chown -R '$USER_NAME':'$USER_NAME' '$APP_DIR'"
 ok "✅ Project directory ready."
 
@@ -62,7 +105,9 @@ log "🐍 Setting up Python virtual environment..."
 if [ ! -d "$VENV_DIR" ]; then
   run "python3 -m venv '$VENV_DIR'"
 fi
-run "source '$VENV_DIR/bin/activate' && pip install --upgrade pip && pip install flask gunicorn && deactivate"
+run "source '$VENV_DIR/bin/activate' && pip install --upgrade pip && pip install flask $SERVER_PACKAGE && deactivate"
+# Optional: brotli-compressed assets (gzip is always available)
+run "'$VENV_DIR/bin/pip' install brotli" || warn "ℹ️  brotli not installed, assets will be served gzip-compressed."
 ok "✅ Virtual environment ready."
 
 # 5) App + Logo
@@ -82,6 +127,16 @@ else
   ok "✅ Logo downloaded to $APP_DIR/static/img/ticc-dash-logo.png"
 fi
 
+log "📚 Downloading vendored Bootstrap and jQuery..."
+for f in $VENDOR_FILES; do
+  if [ -f "$APP_DIR/static/vendor/$f" ]; then
+    warn "ℹ️  $f already exists, skipping download."
+  else
+    run "curl -fsSL '$REPO_RAW_VENDOR/$f' -o '$APP_DIR/static/vendor/$f'"
+  fi
+done
+ok "✅ Front-end libraries stored in $APP_DIR/static/vendor (no CDN needed at runtime)"
+
 # 6) systemd service
 log "⚙️  Creating systemd service..."
 run "sudo bash -c 'cat > \"$SERVICE_FILE\" <<EOF
@@ -90,11 +145,12 @@ Description=$APP_NAME - Time Information of Chrony Clients Dashboard
 After=network.target
 
 [Service]
-User=$USER_NAME
+User=$SERVICE_USER
 WorkingDirectory=$APP_DIR
-ExecStart=$VENV_DIR/bin/gunicorn --bind 0.0.0.0:5000 ticc-dash:app
+ExecStart=$EXEC_START
 Restart=always
 Environment=PYTHONUNBUFFERED=1
+Environment=TICC_BACKEND=$CHRONY_BACKEND
 
 [Install]
 WantedBy=multi-user.target
@@ -113,8 +169,9 @@ echo
 echo "📍 Directory:     $APP_DIR"
 echo "📄 App file:      $APP_DIR/ticc-dash.py"
 echo "🖼️  Logo:          $APP_DIR/static/img/ticc-dash-logo.png"
-echo "🧠 App object:    ticc-dash:app"
-echo "🧩 Service:       $SERVICE_NAME"
+echo "📚 Vendor files:  $APP_DIR/static/vendor"
+echo "🧠 App object:    $APP_OBJECT ($SERVER_MODE)"
+echo "🧩 Service:       $SERVICE_NAME (user $SERVICE_USER, backend $CHRONY_BACKEND)"
 echo
 IP_ADDR="$(hostname -I 2>/dev/null | awk '{print $1}')"
 echo "🌐 Access via:    http://$IP_ADDR:5000/"
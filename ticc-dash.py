@@ -1,404 +1,2900 @@
 # ticc-dash.py
-from flask import Flask, jsonify, render_template_string
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 import subprocess
+import sys
 from datetime import datetime
 import socket
+import os
+import json
+import time
+import fcntl
+import tempfile
+import threading
+import logging
+import struct
+import random
+import secrets
+import mmap
+import gzip
+import io
+import hashlib
+import ipaddress
+import urllib.error
+import urllib.parse
+import urllib.request
+import contextvars
+import asyncio
+from array import array
+from operator import itemgetter
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from bisect import bisect_left
+from contextlib import asynccontextmanager, contextmanager, nullcontext, suppress
+
+try:
+    import brotli
+except ImportError:  # optional: assets are then precompressed with gzip only
+    brotli = None
+try:
+    import msgpack
+except ImportError:  # optional: /data?format=msgpack answers 406 without it
+    msgpack = None
 
 app = Flask(__name__)
+log = logging.getLogger("ticc-dash")
 
-def _is_ipv4(addr: str) -> bool:
-    try:
-        socket.inet_pton(socket.AF_INET, addr)
-        return True
-    except OSError:
-        return False
+# Seconds between two chronyc runs of the background collector.
+POLL_INTERVAL = float(os.environ.get("TICC_POLL_INTERVAL", "1.0"))
+# Directory holding the collector lock and the shared snapshot file, so that
+# all gunicorn workers of one service share a single collector.
+STATE_DIR = os.environ.get("TICC_STATE_DIR") or os.path.join(tempfile.gettempdir(), f"ticc-dash-{os.getuid()}")
+# Where client data comes from: "socket" talks chronyd's command protocol
+# directly, "chronyc" runs `sudo chronyc -n -c clients`, "auto" tries the socket
+# first and falls back to chronyc.
+CHRONY_BACKEND = os.environ.get("TICC_BACKEND", "auto")
+CHRONY_SOCKET = os.environ.get("TICC_CHRONY_SOCKET", "/var/run/chrony/chronyd.sock")
+CHRONY_TIMEOUT = float(os.environ.get("TICC_CHRONY_TIMEOUT", "1.0"))
+# Budget of one collection from the local chronyd (a chronyc run or a whole
+# walk of the command socket), and how many chronyd queries may run at once.
+BACKEND_TIMEOUT = float(os.environ.get("TICC_BACKEND_TIMEOUT", "5.0"))
+BACKEND_CONCURRENCY = int(os.environ.get("TICC_BACKEND_CONCURRENCY", "16"))
+# Client hostnames: chronyc always runs numeric (-n) and addresses are
+# resolved in the background by DNS_WORKERS threads, from reverse DNS
+# ("dns"), a hosts-style file ("hosts:/path") or not at all ("off"). Names
+# are cached for DNS_TTL seconds, failed lookups for DNS_NEGATIVE_TTL.
+RESOLVER = os.environ.get("TICC_RESOLVER", "dns")
+DNS_WORKERS = int(os.environ.get("TICC_DNS_WORKERS", "4"))
+DNS_TTL = float(os.environ.get("TICC_DNS_TTL", "3600"))
+DNS_NEGATIVE_TTL = float(os.environ.get("TICC_DNS_NEGATIVE_TTL", "300"))
+DNS_CACHE_SIZE = int(os.environ.get("TICC_DNS_CACHE_SIZE", "65536"))
+# Number of recent snapshot versions kept to answer /data?since=<epoch>-<version>.
+DELTA_HISTORY = int(os.environ.get("TICC_DELTA_HISTORY", "16"))
+# Seconds between heartbeat events on an idle /stream connection.
+SSE_HEARTBEAT = float(os.environ.get("TICC_SSE_HEARTBEAT", "15"))
+# Per-client history: one sample every HISTORY_STEP seconds, HISTORY_DEPTH
+# samples per client, at most HISTORY_MAX_CLIENTS clients. Rates are computed
+# over RATE_WINDOWS seconds; the first window drives the severity.
+HISTORY_STEP = float(os.environ.get("TICC_HISTORY_STEP", "10"))
+HISTORY_DEPTH = int(os.environ.get("TICC_HISTORY_DEPTH", "32"))
+HISTORY_MAX_CLIENTS = int(os.environ.get("TICC_HISTORY_MAX_CLIENTS", "65536"))
+HISTORY_PATH = os.environ.get("TICC_HISTORY_PATH") or None
+RATE_WINDOWS = tuple(int(w) for w in os.environ.get("TICC_RATE_WINDOWS", "60,300").split(","))
+# Share of NTP requests dropped over the first rate window that makes a client Critical.
+DROP_RATIO_CRITICAL = float(os.environ.get("TICC_DROP_RATIO_CRITICAL", "0.1"))
+# Per-client series on /metrics: at most METRICS_MAX_CLIENTS of them (0 turns
+# them off), picked by "drops" (top-N by dropped packets) or "address".
+METRICS_MAX_CLIENTS = int(os.environ.get("TICC_METRICS_MAX_CLIENTS", "1000"))
+METRICS_CLIENT_ORDER = os.environ.get("TICC_METRICS_CLIENT_ORDER", "drops")
+# Fleet mode: a comma-separated list of chrony servers polled concurrently
+# instead of the local one, each "[name=]endpoint" where endpoint is "local",
+# "socket:/path" (a chronyd command socket on this host) or
+# "http[s]://host[:port]" (another TICC-DASH, for a chronyd on another host:
+# chronyd serves its client table on the Unix socket only). Every server
+# gets SERVER_TIMEOUT seconds per collection.
+SERVERS = os.environ.get("TICC_SERVERS", "")
+SERVER_TIMEOUT = float(os.environ.get("TICC_SERVER_TIMEOUT", "2.0"))
+# Stage timers of the request path and the Server-Timing header they feed
+# ("0" turns both off). The sampling profiler behind /debug/profile is opt-in.
+PERF_TIMING = os.environ.get("TICC_PERF_TIMING", "1") != "0"
+PROFILER = os.environ.get("TICC_PROFILER", "0") == "1"
 
-def _is_ipv6(addr: str) -> bool:
+def _client_sort_key(addr: str) -> bytes:
+    # One comparable key for every row: hostnames (case-insensitive) first,
+    # then IPv4 and IPv6 in numeric order.
     try:
-        socket.inet_pton(socket.AF_INET6, addr)
-        return True
+        if ":" in addr:
+            return b"\x02" + socket.inet_pton(socket.AF_INET6, addr)
+        return b"\x01" + socket.inet_pton(socket.AF_INET, addr)
     except OSError:
-        return False
+        return b"\x00" + addr.lower().encode()
 
 def _parse_client_line(line: str):
-    parts = line.split()
-    if not parts:
+    # One line of `chronyc -c clients`:
+    # addr,NTP,Drop,Int,IntL,Last,Cmd,CmdDrop,CmdInt,CmdLast ("-" = unset)
+    f = line.rstrip().split(",")
+    if len(f) < 7 or not f[0]:
         return None
-    addr = parts[0]
-    f = parts[1:]
-    def g(i): return f[i] if i < len(f) else ""
+    i, il, last = f[3], f[4], f[5]
+    try:
+        return {
+            "addr": f[0],
+            "NTP": int(f[1]),
+            "Drop": int(f[2]),
+            "Int": None if i == "-" else int(i),
+            "IntL": None if il == "-" else int(il),
+            "Last": None if last == "-" else int(last),
+            "Cmd": int(f[6]),
+        }
+    except ValueError:
+        return None
+
+def parse_chronyc_csv(output: str):
+    keyed = []
+    for ln in output.splitlines():
+        row = _parse_client_line(ln)
+        if row:
+            keyed.append((_client_sort_key(row["addr"]), row))
+    keyed.sort(key=itemgetter(0))
+    return [row for _, row in keyed]
+
+class ChronyCommandError(Exception):
+    pass
+
+class ChronyTimeout(ChronyCommandError):
+    """chronyd (or chronyc) did not answer in time."""
+
+# Wire format of chronyd's command protocol (candm.h, protocol version 6).
+_PROTO_VERSION = 6
+_PKT_TYPE_CMD_REQUEST = 1
+_PKT_TYPE_CMD_REPLY = 2
+_REQ_CLIENT_ACCESSES_BY_INDEX3 = 68
+_RPY_CLIENT_ACCESSES_BY_INDEX3 = 21
+_STT_SUCCESS = 0
+_MAX_CLIENT_ACCESSES = 8
+_INVALID_RATE = -128
+_NO_HIT = 0xFFFFFFFF
+_IPADDR_INET4, _IPADDR_INET6 = 1, 2
+
+_REQ_HEADER = struct.Struct("!BBBBHHIII")
+_REQ_CLIENT_ACCESSES = struct.Struct("!IIII")
+_RPY_HEADER = struct.Struct("!BBBBHHHHHHIII")
+_RPY_CLIENT_ACCESSES = struct.Struct("!III")
+_RPY_CLIENT = struct.Struct("!16sHxxIIIIIIbbbbIII")
+# chronyd drops requests shorter than the reply they ask for (anti-amplification).
+_REQUEST_LENGTH = _RPY_HEADER.size + _RPY_CLIENT_ACCESSES.size + _MAX_CLIENT_ACCESSES * _RPY_CLIENT.size
+
+_STATUS_TEXT = {
+    1: "failed", 2: "unauthorised", 3: "invalid command", 6: "not enabled",
+    18: "bad packet version", 19: "bad packet length",
+}
+
+def _decode_ipaddr(raw: bytes, family: int) -> str:
+    if family == _IPADDR_INET4:
+        return socket.inet_ntop(socket.AF_INET, raw[:4])
+    if family == _IPADDR_INET6:
+        return socket.inet_ntop(socket.AF_INET6, raw)
+    return "?"
+
+def _decode_client(buf, offset: int):
+    (raw, family, ntp_hits, _nke_hits, cmd_hits, ntp_drops, _nke_drops, _cmd_drops,
+     ntp_interval, _nke_interval, _cmd_interval, ntp_timeout_interval,
+     last_ntp_ago, _last_nke_ago, _last_cmd_ago) = _RPY_CLIENT.unpack_from(buf, offset)
     return {
-        "addr": addr,
-        "NTP": g(0),
-        "Drop": g(1),
-        "Int": g(2),
-        "IntL": g(3),
-        "Last": g(4),
-        "Cmd": g(5)
+        "addr": _decode_ipaddr(raw, family),
+        "NTP": ntp_hits,
+        "Drop": ntp_drops,
+        "Int": None if ntp_interval == _INVALID_RATE else ntp_interval,
+        "IntL": None if ntp_timeout_interval == _INVALID_RATE else ntp_timeout_interval,
+        "Last": None if last_ntp_ago == _NO_HIT else last_ntp_ago,
+        "Cmd": cmd_hits,
     }
 
+class ChronyCommandClient:
+    """Minimal client for chronyd's binary command protocol.
+
+    Talks to the Unix command socket (``path``): chronyd refuses the
+    client-access request on its UDP command port as unauthorised.
+    ``timeout`` applies to every reply; ``deadline`` (a time.monotonic()
+    value) ends the whole exchange.
+    """
+
+    def __init__(self, path=CHRONY_SOCKET, timeout=CHRONY_TIMEOUT, retries=2, deadline=None):
+        self.path = path
+        self.timeout = timeout
+        self.retries = retries
+        self.deadline = deadline
+
+    def _wait(self) -> float:
+        if self.deadline is None:
+            return self.timeout
+        left = self.deadline - time.monotonic()
+        if left <= 0:
+            raise ChronyTimeout("chronyd did not answer in time")
+        return min(self.timeout, left)
+
+    def _open(self):
+        # chronyd replies to the sender's address, so the client socket must
+        # be bound to a path chronyd can write to (like chronyc does). The
+        # path is unique per call: coroutines of one thread run concurrently.
+        local = os.path.join(os.path.dirname(self.path), f"ticc-dash.{os.getpid()}.{secrets.token_hex(4)}.sock")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            if os.path.exists(local):
+                os.unlink(local)
+            sock.bind(local)
+            os.chmod(local, 0o666)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            if os.path.exists(local):
+                os.unlink(local)
+            raise
+        return sock, local
+
+    @staticmethod
+    def _packet(command: int, attempt: int, sequence: int, body: bytes) -> bytes:
+        pkt = _REQ_HEADER.pack(_PROTO_VERSION, _PKT_TYPE_CMD_REQUEST, 0, 0, command, attempt, sequence, 0, 0) + body
+        return pkt.ljust(_REQUEST_LENGTH, b"\0")
+
+    @staticmethod
+    def _reply(reply: bytes, command: int, sequence: int, reply_code: int):
+        # The reply's body, or None for a packet that answers something else.
+        if len(reply) < _RPY_HEADER.size:
+            return None
+        (version, pkt_type, _, _, r_command, r_reply, status,
+         _, _, _, r_sequence, _, _) = _RPY_HEADER.unpack_from(reply)
+        if pkt_type != _PKT_TYPE_CMD_REPLY or r_sequence != sequence or r_command != command:
+            return None
+        if version != _PROTO_VERSION:
+            raise ChronyCommandError(f"unsupported protocol version {version}")
+        if status != _STT_SUCCESS:
+            raise ChronyCommandError(f"chronyd: {_STATUS_TEXT.get(status, f'status {status}')}")
+        if r_reply != reply_code:
+            raise ChronyCommandError(f"unexpected reply type {r_reply}")
+        return reply[_RPY_HEADER.size:]
+
+    @staticmethod
+    def _page(data: bytes, first: int, rows):
+        # Decodes one client-access reply into ``rows``; the next index to
+        # ask for, or None after the last one.
+        if len(data) < _RPY_CLIENT_ACCESSES.size:
+            raise ChronyCommandError("truncated reply")
+        n_indices, next_index, n_clients = _RPY_CLIENT_ACCESSES.unpack_from(data)
+        n_clients = min(n_clients, _MAX_CLIENT_ACCESSES)
+        if len(data) < _RPY_CLIENT_ACCESSES.size + n_clients * _RPY_CLIENT.size:
+            raise ChronyCommandError("truncated reply")
+        for i in range(n_clients):
+            rows.append(_decode_client(data, _RPY_CLIENT_ACCESSES.size + i * _RPY_CLIENT.size))
+        if next_index >= n_indices or next_index <= first:
+            return None
+        return next_index
+
+    @staticmethod
+    def _close(sock, local):
+        sock.close()
+        if local:
+            try:
+                os.unlink(local)
+            except OSError:
+                pass
+
+    def _request(self, sock, command: int, body: bytes, reply_code: int) -> bytes:
+        sequence = random.getrandbits(32)
+        for attempt in range(self.retries + 1):
+            sock.settimeout(self._wait())
+            sock.send(self._packet(command, attempt, sequence, body))
+            try:
+                while True:
+                    data = self._reply(sock.recv(4096), command, sequence, reply_code)
+                    if data is not None:
+                        return data
+            except socket.timeout:
+                continue
+        raise ChronyTimeout("no reply from chronyd")
+
+    def client_accesses(self):
+        sock, local = self._open()
+        rows = []
+        try:
+            first = 0
+            while first is not None:
+                body = _REQ_CLIENT_ACCESSES.pack(first, _MAX_CLIENT_ACCESSES, 0, 0)
+                data = self._request(sock, _REQ_CLIENT_ACCESSES_BY_INDEX3, body, _RPY_CLIENT_ACCESSES_BY_INDEX3)
+                first = self._page(data, first, rows)
+        finally:
+            self._close(sock, local)
+        return rows
+
+    # The same exchange on the running event loop, for the ASGI app.
+    async def _request_async(self, sock, command: int, body: bytes, reply_code: int) -> bytes:
+        loop = asyncio.get_running_loop()
+        sequence = random.getrandbits(32)
+
+        async def receive():
+            while True:
+                data = self._reply(await loop.sock_recv(sock, 4096), command, sequence, reply_code)
+                if data is not None:
+                    return data
+
+        for attempt in range(self.retries + 1):
+            wait = self._wait()
+            await loop.sock_sendall(sock, self._packet(command, attempt, sequence, body))
+            try:
+                return await asyncio.wait_for(receive(), wait)
+            except asyncio.TimeoutError:
+                continue
+        raise ChronyTimeout("no reply from chronyd")
+
+    async def client_accesses_async(self):
+        sock, local = self._open()
+        sock.setblocking(False)
+        rows = []
+        try:
+            first = 0
+            while first is not None:
+                body = _REQ_CLIENT_ACCESSES.pack(first, _MAX_CLIENT_ACCESSES, 0, 0)
+                data = await self._request_async(sock, _REQ_CLIENT_ACCESSES_BY_INDEX3, body,
+                                                 _RPY_CLIENT_ACCESSES_BY_INDEX3)
+                first = self._page(data, first, rows)
+        finally:
+            self._close(sock, local)
+        return rows
+
+class Histogram:
+    """Cumulative latency histogram in Prometheus' bucket layout."""
+
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, counts=None, total=0.0, last=None):
+        self.counts = list(counts) if counts else [0] * (len(self.BUCKETS) + 1)
+        self.sum = total
+        self.last = last
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.last = seconds
+
+    def quantile(self, q: float):
+        """Estimate of the q-quantile, interpolated within its bucket like
+        Prometheus' histogram_quantile(); None without observations."""
+        rank = q * self.count
+        if not rank:
+            return None
+        lower, cumulative = 0.0, 0
+        for upper, n in zip(self.BUCKETS, self.counts):
+            if n and cumulative + n >= rank:
+                return lower + (upper - lower) * (rank - cumulative) / n
+            lower, cumulative = upper, cumulative + n
+        return lower
+
+    def to_dict(self):
+        return {"counts": self.counts, "sum": self.sum, "last": self.last}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["counts"], d["sum"], d.get("last"))
+
+class StageHistogram(Histogram):
+    """Histogram for request stages, most of which take well under a millisecond."""
+
+    BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025) + Histogram.BUCKETS
+
+# Timings of the collector's backend calls, published with the snapshot.
+collector_stats = {"backend": Histogram(), "parse": Histogram(), "annotate": Histogram(), "dns": Histogram()}
+# Timings of the request path in this process: stages (see timed()) and
+# whole requests by endpoint.
+request_stats = {}
+route_stats = {}
+# [hits, misses] of the per-snapshot caches, Snapshot.derived() and view_cached().
+cache_stats = {"derived": [0, 0], "view": [0, 0]}
+# Stage durations of the current request, for its Server-Timing header.
+_request_timings = contextvars.ContextVar("ticc_request_timings", default=None)
+
+class _StageTimer:
+    __slots__ = ("stage", "t0")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        dt = time.perf_counter() - self.t0
+        hist = request_stats.get(self.stage)
+        if hist is None:
+            hist = request_stats.setdefault(self.stage, StageHistogram())
+        hist.observe(dt)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[self.stage] = timings.get(self.stage, 0.0) + dt
+
+def timed(stage: str):
+    """Context manager timing one stage of the request path (a no-op with
+    TICC_PERF_TIMING=0)."""
+    return _StageTimer(stage) if PERF_TIMING else nullcontext()
+
+# At most BACKEND_CONCURRENCY chronyd queries (chronyc runs and socket
+# walks) at a time, in threads and on the event loop alike.
+_backend_slots = threading.BoundedSemaphore(BACKEND_CONCURRENCY)
+_backend_slots_async = asyncio.Semaphore(BACKEND_CONCURRENCY)
+
+@contextmanager
+def _backend_slot(timeout: float):
+    if not _backend_slots.acquire(timeout=max(0.0, timeout)):
+        raise ChronyCommandError(f"{BACKEND_CONCURRENCY} chronyd queries already running")
+    try:
+        yield
+    finally:
+        _backend_slots.release()
+
+@asynccontextmanager
+async def _backend_slot_async(timeout: float):
+    try:
+        await asyncio.wait_for(_backend_slots_async.acquire(), max(0.0, timeout))
+    except asyncio.TimeoutError:
+        raise ChronyCommandError(f"{BACKEND_CONCURRENCY} chronyd queries already running") from None
+    try:
+        yield
+    finally:
+        _backend_slots_async.release()
+
+def _run_chronyc(argv, timeout: float) -> str:
+    proc = subprocess.Popen(argv, stdout=subprocess.PIPE, universal_newlines=True)
+    try:
+        output, _ = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        # SIGTERM first: sudo passes it on to chronyc, SIGKILL would orphan
+        # it. Only the exit is awaited, not the end of output that anything
+        # left behind may still hold open.
+        proc.terminate()
+        try:
+            proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        raise ChronyTimeout(f"chronyc did not finish within {timeout:g}s") from None
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, argv)
+    return output
+
+async def _run_chronyc_async(argv, timeout: float) -> str:
+    proc = await asyncio.create_subprocess_exec(*argv, stdout=subprocess.PIPE)
+    try:
+        output, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        # As in _run_chronyc(); here wait() also waits for the output to
+        # close, so after a grace period it is killed and left to the reaper.
+        proc.terminate()
+        try:
+            await asyncio.wait_for(proc.wait(), 1)
+        except asyncio.TimeoutError:
+            with suppress(ProcessLookupError):
+                proc.kill()
+        raise ChronyTimeout(f"chronyc did not finish within {timeout:g}s") from None
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, argv)
+    return output.decode()
+
+def _sorted_result(rows, t0, t1):
+    rows.sort(key=lambda r: _client_sort_key(r["addr"]))
+    collector_stats["backend"].observe(t1 - t0)
+    collector_stats["parse"].observe(time.perf_counter() - t1)
+    return rows, len(rows), ""
+
+def _parsed_result(output, t0, t1):
+    parsed = parse_chronyc_csv(output)
+    collector_stats["backend"].observe(t1 - t0)
+    collector_stats["parse"].observe(time.perf_counter() - t1)
+    return parsed, len(parsed), ""
+
+def _get_clients_via_socket():
+    t0 = time.perf_counter()
+    with _backend_slot(BACKEND_TIMEOUT):
+        rows = ChronyCommandClient(CHRONY_SOCKET, deadline=time.monotonic() + BACKEND_TIMEOUT).client_accesses()
+    return _sorted_result(rows, t0, time.perf_counter())
+
+_socket_backend_failed = False
+
+def _socket_unavailable(e):
+    # The error result with TICC_BACKEND=socket; None when auto falls back to chronyc.
+    global _socket_backend_failed
+    if CHRONY_BACKEND == "socket":
+        return [], 0, f"Error: {e}"
+    if not _socket_backend_failed:
+        log.warning("chronyd command socket unavailable (%s), falling back to chronyc", e)
+        _socket_backend_failed = True
+    return None
+
 def get_chrony_clients():
+    if CHRONY_BACKEND in ("socket", "auto"):
+        try:
+            return _get_clients_via_socket()
+        except (OSError, ChronyCommandError) as e:
+            failed = _socket_unavailable(e)
+            if failed:
+                return failed
+    return _get_clients_via_chronyc()
+
+def _get_clients_via_chronyc():
+    t0 = time.perf_counter()
     try:
-        output = subprocess.check_output(["sudo", "chronyc", "clients"], universal_newlines=True)
+        with _backend_slot(BACKEND_TIMEOUT):
+            output = _run_chronyc(["sudo", "chronyc", "-n", "-c", "clients"], BACKEND_TIMEOUT)
     except Exception as e:
         return [], 0, f"Error: {e}"
+    return _parsed_result(output, t0, time.perf_counter())
+
+async def get_chrony_clients_async():
+    """get_chrony_clients() on the running event loop: neither the socket nor
+    chronyc blocks it, and no call outlives BACKEND_TIMEOUT."""
+    if CHRONY_BACKEND in ("socket", "auto"):
+        t0 = time.perf_counter()
+        try:
+            async with _backend_slot_async(BACKEND_TIMEOUT):
+                client = ChronyCommandClient(CHRONY_SOCKET, deadline=time.monotonic() + BACKEND_TIMEOUT)
+                rows = await client.client_accesses_async()
+            return _sorted_result(rows, t0, time.perf_counter())
+        except (OSError, ChronyCommandError) as e:
+            failed = _socket_unavailable(e)
+            if failed:
+                return failed
+    t0 = time.perf_counter()
+    try:
+        async with _backend_slot_async(BACKEND_TIMEOUT):
+            output = await _run_chronyc_async(["sudo", "chronyc", "-n", "-c", "clients"], BACKEND_TIMEOUT)
+    except Exception as e:
+        return [], 0, f"Error: {e}"
+    return _parsed_result(output, t0, time.perf_counter())
+
+# Row fields taken from another TICC-DASH; rates and status are recomputed here.
+_REMOTE_FIELDS = ("addr", "hostname", "NTP", "Drop", "Int", "IntL", "last_seen", "Cmd")
+
+def _rows_from_columns(payload):
+    # The client rows of a /data?format=columns body.
+    table = payload.get("clients_parsed") or {"columns": [], "data": []}
+    columns, data = table["columns"], table["data"]
+    rows = []
+    for values in zip(*data):
+        full = dict(zip(columns, values))
+        row = {k: full.get(k) for k in _REMOTE_FIELDS}
+        if row["hostname"] is None:
+            del row["hostname"]
+        rows.append(row)
+    if not rows and payload.get("error"):
+        raise ChronyCommandError(payload["error"].removeprefix("Error: "))
+    return rows
+
+class ChronyServer:
+    """One entry of TICC_SERVERS: ``local``, a chronyd command socket
+    (``socket:/path``) or another TICC-DASH (``http[s]://host[:port]``),
+    whose /data it reads."""
 
-    lines = output.strip().split("\n")
-    if len(lines) < 3:
-        return [], 0, ""
-
-    body = [ln.rstrip() for ln in lines[2:] if ln.strip() != ""]
-    hostnames, ipv4s, ipv6s = [], [], []
-    for ln in body:
-        addr = (ln.split() or [""])[0]
-        if _is_ipv4(addr):
-            ipv4s.append(ln)
-        elif _is_ipv6(addr):
-            ipv6s.append(ln)
+    def __init__(self, spec: str):
+        name, sep, endpoint = spec.partition("=")
+        if not sep:
+            name, endpoint = "", spec
+        self.endpoint = endpoint = endpoint.strip()
+        kind, _, target = endpoint.partition(":")
+        self.kind, self.target = kind, target
+        if endpoint == "local":
+            default = "local"
+        elif kind == "socket" and target:
+            default = target
+        elif kind in ("http", "https") and urllib.parse.urlsplit(endpoint).hostname:
+            self.kind, self.target = "http", endpoint.rstrip("/")
+            default = urllib.parse.urlsplit(endpoint).hostname
         else:
-            hostnames.append(ln)
+            raise ValueError(f"bad chrony server {spec!r}")
+        self.name = name.strip() or default
 
-    hostnames.sort(key=lambda x: x.split()[0].lower())
-    ipv4s.sort(key=lambda x: tuple(map(int, (x.split()[0]).split("."))))
-    ipv6s.sort(key=lambda x: x.split()[0])
-    sorted_lines = hostnames + ipv4s + ipv6s
+    def _client(self, timeout: float) -> ChronyCommandClient:
+        return ChronyCommandClient(self.target, timeout=min(CHRONY_TIMEOUT, timeout),
+                                   deadline=time.monotonic() + timeout)
 
-    parsed = []
-    for ln in sorted_lines:
-        row = _parse_client_line(ln)
-        if row:
-            parsed.append(row)
-    return parsed, len(parsed), ""
+    def _fetch_http(self, timeout: float):
+        url = self.target + "/data?format=columns"
+        req = urllib.request.Request(url, headers={"Accept-Encoding": "gzip"})
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                body = resp.read()
+                if resp.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+        except TimeoutError:
+            raise ChronyTimeout(f"{url} did not answer in time") from None
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, TimeoutError):
+                raise ChronyTimeout(f"{url} did not answer in time") from None
+            raise ChronyCommandError(f"{url}: {e.reason}") from None
+        try:
+            return _rows_from_columns(json.loads(body))
+        except (ValueError, KeyError, TypeError) as e:
+            raise ChronyCommandError(f"{url}: unexpected reply ({e})") from None
+
+    def fetch(self, timeout: float):
+        if self.kind == "local":
+            rows, _, err = get_chrony_clients()
+            if err:
+                raise ChronyCommandError(err.removeprefix("Error: "))
+            return rows
+        if self.kind == "http":
+            rows = self._fetch_http(timeout)
+        else:
+            with _backend_slot(timeout):
+                rows = self._client(timeout).client_accesses()
+        rows.sort(key=lambda r: _client_sort_key(r["addr"]))
+        return rows
+
+    async def fetch_async(self, timeout: float):
+        if self.kind == "local":
+            rows, _, err = await get_chrony_clients_async()
+            if err:
+                raise ChronyCommandError(err.removeprefix("Error: "))
+            return rows
+        if self.kind == "http":
+            # urllib blocks: the call runs in the loop's executor.
+            rows = await asyncio.get_running_loop().run_in_executor(None, self._fetch_http, timeout)
+        else:
+            async with _backend_slot_async(timeout):
+                rows = await self._client(timeout).client_accesses_async()
+        rows.sort(key=lambda r: _client_sort_key(r["addr"]))
+        return rows
+
+class _ServerCall(threading.Thread):
+    # One fetch from one server; a daemon thread, so a hung server never
+    # holds up the interpreter's exit.
+    def __init__(self, fetch, server):
+        super().__init__(name=f"ticc-fleet-{server.name}", daemon=True)
+        self._fetch, self._server = fetch, server
+        self.rows, self.error, self.timed_out = [], "", False
+        self.start()
+
+    def run(self):
+        try:
+            self.rows = self._fetch(self._server)
+        except ChronyTimeout:
+            self.timed_out = True
+        except Exception as e:
+            self.error = f"Error: {e}"
+
+class FleetPoller:
+    """Collects the client tables of several chrony servers concurrently.
+
+    Returns the merged rows, each tagged with its ``server``, plus the status
+    of every server. A server that has not answered within ``timeout`` is
+    reported as failed for that round; its call keeps running and the next
+    round waits for that same call instead of starting another one. Every
+    way of running out of time gives the same error, so a slow server does
+    not change the status (and the snapshot version) from round to round.
+    """
+
+    def __init__(self, servers, timeout=SERVER_TIMEOUT, stats=None):
+        names = [s.name for s in servers]
+        if not servers or len(set(names)) != len(names):
+            raise ValueError("TICC_SERVERS needs at least one server and unique names")
+        self.servers = servers
+        self.timeout = timeout
+        # Keys are created up front: the collector serializes this dict
+        # while straggling calls may still be observing into it.
+        self._stats = stats if stats is not None else {}
+        for name in names:
+            self._stats.setdefault(f"server:{name}", Histogram())
+        self._pending = {}
+
+    def _fetch(self, server: ChronyServer):
+        t0 = time.perf_counter()
+        try:
+            return server.fetch(self.timeout)
+        finally:
+            self._stats[f"server:{server.name}"].observe(time.perf_counter() - t0)
+
+    def __call__(self):
+        calls = {}
+        for server in self.servers:
+            call = self._pending.pop(server.name, None)
+            calls[server.name] = call if call is not None else _ServerCall(self._fetch, server)
+        deadline = time.monotonic() + self.timeout
+        for call in calls.values():
+            call.join(max(0.0, deadline - time.monotonic()))
+
+        results = []
+        for server in self.servers:
+            call = calls[server.name]
+            if call.is_alive():
+                self._pending[server.name] = call
+                results.append(([], self._timeout_error()))
+            elif call.timed_out:
+                results.append(([], self._timeout_error()))
+            else:
+                results.append((call.rows, call.error))
+        return self._merge(results)
+
+    async def collect_async(self):
+        """The same collection on the running event loop; a server that has
+        not answered in time is cancelled (its chronyc is terminated)."""
+        async def one(server):
+            t0 = time.perf_counter()
+            try:
+                return await asyncio.wait_for(server.fetch_async(self.timeout), self.timeout), ""
+            except (asyncio.TimeoutError, ChronyTimeout):
+                return [], self._timeout_error()
+            except Exception as e:
+                return [], f"Error: {e}"
+            finally:
+                self._stats[f"server:{server.name}"].observe(time.perf_counter() - t0)
+
+        return self._merge(await asyncio.gather(*(one(s) for s in self.servers)))
+
+    def _timeout_error(self) -> str:
+        return f"Error: no reply within {self.timeout:g}s"
+
+    def _merge(self, results):
+        # ``results`` holds (rows, error) per server, in self.servers order.
+        rows, status, errors = [], [], []
+        for server, (got, error) in zip(self.servers, results):
+            for row in got:
+                row["server"] = server.name
+            rows.extend(got)
+            status.append({"name": server.name, "endpoint": server.endpoint, "count": len(got), "error": error})
+            if error:
+                errors.append(f"{server.name}: {error}")
+        # Every server's rows are sorted already, so this mostly merges runs.
+        rows.sort(key=lambda r: (_client_sort_key(r["addr"]), r["server"]))
+        err = "; ".join(errors) if len(errors) == len(self.servers) else ""
+        return rows, len(rows), err, status
+
+def reverse_dns(addr: str):
+    return socket.gethostbyaddr(addr)[0]
+
+def hosts_file_resolver(path: str):
+    """A resolver answering from a hosts(5)-style file instead of DNS."""
+    names = {}
+    with open(path) as fh:
+        for line in fh:
+            fields = line.split("#", 1)[0].split()
+            if len(fields) < 2:
+                continue
+            try:
+                names.setdefault(str(ipaddress.ip_address(fields[0])), fields[1])
+            except ValueError:
+                pass
+    return names.get
+
+class HostnameResolver:
+    """Client hostnames, looked up off the collection path.
+
+    annotate() adds ``hostname`` to the rows whose address is in the LRU
+    cache and queues the others for ``workers`` daemon threads calling
+    ``resolve(addr)``, which returns a name or None (or raises) and may
+    block. Names are kept for ``ttl`` seconds and failures for
+    ``negative_ttl``; an expired name is still used while it is looked up
+    again.
+    """
+
+    def __init__(self, resolve=reverse_dns, workers=DNS_WORKERS, ttl=DNS_TTL, negative_ttl=DNS_NEGATIVE_TTL,
+                 max_entries=DNS_CACHE_SIZE, stats=None):
+        self.resolve = resolve
+        self.workers = max(1, workers)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._stats = stats if stats is not None else {}
+        self._stats.setdefault("dns", Histogram())
+        self._cache = OrderedDict()  # addr -> (hostname or None, expires at)
+        self._lock = threading.Lock()
+        self._queued = threading.Condition(self._lock)
+        self._queue = deque()
+        self._pending = set()
+        self._pid = None
+        self.hits = self.misses = self.failures = 0
+
+    def annotate(self, rows):
+        now = time.monotonic()
+        todo = []
+        with self._lock:
+            cache = self._cache
+            for row in rows:
+                addr = row["addr"]
+                hit = cache.get(addr)
+                if hit is None:
+                    self.misses += 1
+                    todo.append(addr)
+                    continue
+                self.hits += 1
+                cache.move_to_end(addr)
+                name, expires = hit
+                if name:
+                    row["hostname"] = name
+                if expires <= now:
+                    todo.append(addr)
+            self._enqueue(todo)
+
+    def _enqueue(self, addrs):
+        # Called with the lock held.
+        added = False
+        for addr in addrs:
+            if addr not in self._pending and len(self._pending) < self.max_entries:
+                self._pending.add(addr)
+                self._queue.append(addr)
+                added = True
+        if not added:
+            return
+        if self._pid != os.getpid():
+            # Started lazily and re-started after a fork, like the collector.
+            self._pid = os.getpid()
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f"ticc-dns-{i}", daemon=True).start()
+        self._queued.notify(len(self._queue))
+
+    def _work(self):
+        while True:
+            with self._queued:
+                self._queued.wait_for(lambda: self._queue)
+                addr = self._queue.popleft()
+            t0 = time.perf_counter()
+            try:
+                name = self.resolve(addr)
+            except Exception:
+                name = None
+            self._stats["dns"].observe(time.perf_counter() - t0)
+            if name == addr:
+                name = None
+            with self._lock:
+                self._pending.discard(addr)
+                if name is None:
+                    self.failures += 1
+                self._cache[addr] = (name, time.monotonic() + (self.ttl if name else self.negative_ttl))
+                self._cache.move_to_end(addr)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._cache), "pending": len(self._pending), "hits": self.hits,
+                    "misses": self.misses, "failures": self.failures, "workers": self.workers}
+
+def make_resolver(spec: str):
+    if spec == "off":
+        return None
+    if spec == "dns":
+        return HostnameResolver(reverse_dns, stats=collector_stats)
+    if spec.startswith("hosts:"):
+        return HostnameResolver(hosts_file_resolver(spec[6:]), stats=collector_stats)
+    raise ValueError(f"TICC_RESOLVER must be dns, off or hosts:/path, not {spec!r}")
+
+def get_local_time(ts=None):
+    return (datetime.now() if ts is None else datetime.fromtimestamp(ts)).strftime("%d-%m-%Y, %H:%M:%S")
+
+SORT_MODES = ("ip_order", "drop_desc", "last_recent")
+SEVERITY_LABELS = ("ok", "warning", "critical")
+# Distinct per-view results (selections, encoded events) remembered per snapshot.
+VIEW_CACHE_SIZE = 128
+
+def severity(row) -> int:
+    # Current drop rate when the history has it, lifetime drops otherwise.
+    ratio = row.get("drop_ratio")
+    if ratio is not None:
+        if ratio >= DROP_RATIO_CRITICAL:
+            return 2
+        return 1 if ratio > 0 else 0
+    drop = row["Drop"] or 0
+    if drop >= 10:
+        return 2
+    if drop > 0:
+        return 1
+    return 0
+
+def row_key(row) -> str:
+    # Identity of a row: its address, qualified by its server in fleet mode.
+    server = row.get("server")
+    return row["addr"] if server is None else f"{server}|{row['addr']}"
+
+def _ip_order_key(row):
+    # IPv4 numerically first, then everything else alphabetically (the
+    # dashboard's "IP Address" sort).
+    addr = row["addr"]
+    try:
+        return (0, socket.inet_pton(socket.AF_INET, addr))
+    except OSError:
+        return (1, addr.lower().encode())
+
+def _last_recent_key(row):
+    last = row["last_seen"]
+    return (last is None, -(last or 0))
+
+def stamp_last_seen(rows, now, previous=None):
+    """Replace chronyd's ``Last`` (seconds before ``now``) by ``last_seen``, the
+    absolute time of the client's last NTP packet.
+
+    ``Last`` grows on every collection even when nothing else changes, while
+    ``last_seen`` only moves with a new packet. Both are whole seconds, so
+    the same packet can come out a second apart on two collections; a value
+    within a second of the row's ``last_seen`` in ``previous`` (row_key ->
+    row) keeps that one.
+    """
+    previous = previous or {}
+    for row in rows:
+        if "Last" not in row:
+            # Rows read from another TICC-DASH carry last_seen already.
+            row.setdefault("last_seen", None)
+            continue
+        last = row.pop("Last")
+        if last is None:
+            row["last_seen"] = None
+            continue
+        seen = round(now - last)
+        prev = previous.get(row_key(row))
+        if prev is not None and prev.get("last_seen") is not None and abs(prev["last_seen"] - seen) <= 1:
+            seen = prev["last_seen"]
+        row["last_seen"] = seen
+
+class Snapshot:
+    """One collected client table.
+
+    ``version`` grows by one whenever the table or error changes; an
+    unchanged collection keeps the previous Snapshot (and everything derived
+    from it) and only moves ``taken_at``. ``epoch`` tells version sequences
+    of different collector lifetimes apart; version 0 is never published.
+    In fleet mode ``servers`` holds the status of every polled server.
+    A ``stale`` snapshot keeps the last good table (and its ``taken_at``)
+    while collections fail with ``error``.
+    """
+
+    __slots__ = ("clients", "count", "error", "taken_at", "epoch", "version", "updated_at", "servers", "stale",
+                 "_derived", "_derived_lock", "_views", "_building")
+
+    def __init__(self, clients, count, error, taken_at, epoch="", version=0, updated_at=None, servers=None,
+                 stale=False):
+        self.clients = clients
+        self.count = count
+        self.error = error
+        self.servers = servers
+        self.stale = stale
+        self.taken_at = taken_at
+        self.epoch = epoch
+        self.version = version
+        self.updated_at = taken_at if updated_at is None else updated_at
+        self._derived = {}
+        self._derived_lock = threading.RLock()
+        self._views = OrderedDict()
+        self._building = {}
+
+    def age(self) -> float:
+        return max(0.0, time.time() - self.taken_at)
+
+    @property
+    def etag(self) -> str:
+        return f"{self.epoch}-{self.version}"
+
+    def same_content(self, clients, error, servers=None) -> bool:
+        return self.error == error and self.servers == servers and self.clients == clients
+
+    def by_key(self):
+        return self.derived("by_key", lambda s: {row_key(r): r for r in s.clients})
+
+    def derived(self, key, build):
+        # Computed at most once per snapshot and shared by every request.
+        try:
+            value = self._derived[key]
+        except KeyError:
+            pass
+        else:
+            cache_stats["derived"][0] += 1
+            return value
+        with self._derived_lock:
+            if key in self._derived:
+                cache_stats["derived"][0] += 1
+            else:
+                cache_stats["derived"][1] += 1
+                self._derived[key] = build(self)
+            return self._derived[key]
+
+    def view_cached(self, key, build):
+        # Like derived(), for results that depend on request parameters: only
+        # the VIEW_CACHE_SIZE most recently used ones are kept. Builds run
+        # outside the lock; a caller asking for a key that is being built
+        # waits for that build instead of starting its own.
+        with self._derived_lock:
+            hit = self._views.get(key)
+            if hit is not None:
+                self._views.move_to_end(key)
+                cache_stats["view"][0] += 1
+                return hit
+            pending = self._building.get(key)
+            if pending is None:
+                self._building[key] = future = Future()
+        if pending is not None:
+            cache_stats["view"][0] += 1
+            return pending.result()
+        cache_stats["view"][1] += 1
+        try:
+            value = build(self)
+        except BaseException as e:
+            with self._derived_lock:
+                del self._building[key]
+            future.set_exception(e)
+            raise
+        with self._derived_lock:
+            self._views[key] = value
+            while len(self._views) > VIEW_CACHE_SIZE:
+                self._views.popitem(last=False)
+            del self._building[key]
+        future.set_result(value)
+        return value
+
+    def severities(self):
+        return self.derived("severities", lambda s: [severity(r) for r in s.clients])
+
+    def summary(self, indices=None):
+        sev = self.severities()
+        counts = [0, 0, 0]
+        for i in (range(len(sev)) if indices is None else indices):
+            counts[sev[i]] += 1
+        return dict(zip(SEVERITY_LABELS, counts))
+
+    def order(self, mode):
+        rows = self.clients
+        if mode is None:
+            return self.derived("order:", lambda s: list(range(len(rows))))
+        if mode == "ip_order":
+            key = lambda i: _ip_order_key(rows[i])
+        elif mode == "drop_desc":
+            key = lambda i: -(rows[i]["Drop"] or 0)
+        elif mode == "last_recent":
+            key = lambda i: _last_recent_key(rows[i])
+        else:
+            raise ValueError(f"unknown sort mode {mode!r}")
+
+        def build(s):
+            with timed("sort"):
+                return sorted(range(len(rows)), key=key)
+        return self.derived("order:" + mode, build)
+
+    def search_index(self):
+        def build(s):
+            return [
+                "\t".join("" if v is None else str(v) for v in r.values()).lower()
+                for r in s.clients
+            ]
+        return self.derived("search", build)
+
+    def select(self, mode=None, query="", server=None):
+        """Row indices in ``mode`` order that contain ``query`` (and come from
+        ``server``), plus their summary."""
+        query = query.strip().lower()
+        if not query and server is None:
+            return self.order(mode), self.derived("summary", lambda s: s.summary())
+
+        def build(s):
+            order = s.order(mode)
+            with timed("search"):
+                if server is not None:
+                    rows = s.clients
+                    order = [i for i in order if rows[i].get("server") == server]
+                if query:
+                    hay = s.search_index()
+                    order = [i for i in order if query in hay[i]]
+                return order, s.summary(order)
+        return self.view_cached(("select", mode, query, server), build)
+
+    def server_summaries(self):
+        """The server status list with each server's OK/Warning/Critical counts."""
+        def build(s):
+            counts = {}
+            for row, sev in zip(s.clients, s.severities()):
+                counts.setdefault(row.get("server"), [0, 0, 0])[sev] += 1
+            return [dict(info, summary=dict(zip(SEVERITY_LABELS, counts.get(info["name"], (0, 0, 0)))))
+                    for info in s.servers or ()]
+        return self.derived("servers", build)
+
+    def to_dict(self):
+        return {"clients": self.clients, "count": self.count, "error": self.error, "taken_at": self.taken_at,
+                "epoch": self.epoch, "version": self.version, "updated_at": self.updated_at,
+                "servers": self.servers, "stale": self.stale}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["clients"], d["count"], d["error"], d["taken_at"],
+                   d.get("epoch", ""), d.get("version", 0), d.get("updated_at"), d.get("servers"),
+                   d.get("stale", False))
+
+def diff_snapshots(old: Snapshot, new: Snapshot):
+    """Rows added, changed and keys (see row_key) removed going from ``old`` to ``new``."""
+    before, after = old.by_key(), new.by_key()
+    added, changed = [], []
+    for key, row in after.items():
+        prev = before.get(key)
+        if prev is None:
+            added.append(row)
+        elif prev != row:
+            changed.append(row)
+    removed = [key for key in before if key not in after]
+    return {"added": added, "changed": changed, "removed": removed}
+
+def diff_pages(old_rows, new_rows):
+    """Like diff_snapshots for two pages of rows, plus the new ``order`` of
+    row keys when it is not simply the old one."""
+    before = {row_key(r): r for r in old_rows}
+    after = [row_key(r) for r in new_rows]
+    present = set(after)
+    added, changed = [], []
+    for key, row in zip(after, new_rows):
+        prev = before.get(key)
+        if prev is None:
+            added.append(row)
+        elif prev != row:
+            changed.append(row)
+    removed = [key for key in before if key not in present]
+    delta = {"added": added, "changed": changed, "removed": removed}
+    if after != list(before):
+        delta["order"] = after
+    return delta
+
+class HistoryStore:
+    """Per-client counter history in one flat, fixed-layout buffer.
+
+    Every client (by row_key) owns a slot: a 72-byte header (key, sample
+    sequence number, sample count) and a ring of ``depth`` samples of four
+    uint32 (time, NTP, Drop, Cmd), so a client costs 72 + 16 * depth bytes
+    no matter how long it is watched. The buffer is an anonymous mmap
+    (pages are only committed for used slots) or, with ``path``, a shared
+    file mapping that survives restarts.
+
+    Samples are taken every ``step`` seconds. For each rate window the store
+    keeps the sequence number of the sample where the window starts and
+    moves it forward as samples arrive, so rates cost O(1) per client.
+    """
+
+    _MAGIC = b"TICCHST1"
+    _FILE_HEADER = struct.Struct("=8sIIII")
+    _HEADER_BYTES = 64
+    _ADDR_BYTES = 64
+    _SLOT_WORDS = (_ADDR_BYTES + 8) // 4
+    _FIELDS = 4
+
+    def __init__(self, depth, max_clients, step, windows, path=None):
+        # A window longer than the ring would silently shrink to the ring's span.
+        span = step * (depth - 1)
+        too_long = [w for w in windows if w > span]
+        if too_long:
+            raise ValueError(f"TICC_RATE_WINDOWS {', '.join(map(str, too_long))} longer than the "
+                             f"{span:g}s the history holds (TICC_HISTORY_STEP x (TICC_HISTORY_DEPTH - 1))")
+        self.depth = depth
+        self.max_clients = max_clients
+        self.step = step
+        self.windows = tuple(windows)
+        self.path = path
+        self._lock = threading.Lock()
+        self._slot_base = self._HEADER_BYTES // 4
+        self._sample_base = self._slot_base + max_clients * self._SLOT_WORDS
+        size = (self._sample_base + max_clients * depth * self._FIELDS) * 4
+        self._buf = self._map(size)
+        self._words = memoryview(self._buf).cast("I")
+        self._tails = array("I", bytes(4 * max_clients * len(self.windows)))
+        self._slots = {}
+        self._free = []
+        self._used = 0
+        self._last_sample = float("-inf")
+        self._evicted_at = None
+        self._rates = {}
+        self._load()
+
+    def _map(self, size):
+        if self.path is None:
+            return mmap.mmap(-1, size)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            return mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def _load(self):
+        header = self._FILE_HEADER.pack(self._MAGIC, self.depth, self.max_clients, self._SLOT_WORDS, 0)
+        if self._buf[:len(header)] != header:
+            self._buf[:self._HEADER_BYTES] = header.ljust(self._HEADER_BYTES, b"\0")
+            return
+        for slot in range(self.max_clients):
+            off = (self._slot_base + slot * self._SLOT_WORDS) * 4
+            raw = self._buf[off:off + self._ADDR_BYTES].rstrip(b"\0")
+            if raw:
+                self._slots[raw.decode("utf-8", "replace")] = slot
+                self._used = slot + 1
+        taken = set(self._slots.values())
+        self._free = [s for s in range(self._used) if s not in taken]
+
+    def reopen(self, path):
+        return HistoryStore(self.depth, self.max_clients, self.step, self.windows, path)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _header(self, slot):
+        return self._slot_base + slot * self._SLOT_WORDS + self._ADDR_BYTES // 4
+
+    def _sample(self, slot, seq):
+        return self._sample_base + (slot * self.depth + seq % self.depth) * self._FIELDS
+
+    def _allocate(self, addr, now):
+        if not self._free and self._used < self.max_clients:
+            self._free.append(self._used)
+            self._used += 1
+        if not self._free:
+            # One scan per sample round frees every slot that can be freed;
+            # the clients still without one get no history this round.
+            if self._evicted_at == now:
+                return None
+            self._evicted_at = now
+            self._evict(now)
+            if not self._free:
+                return None
+        slot = self._free.pop()
+        off = (self._slot_base + slot * self._SLOT_WORDS) * 4
+        self._buf[off:off + self._ADDR_BYTES] = addr.encode()[:self._ADDR_BYTES].ljust(self._ADDR_BYTES, b"\0")
+        h = self._header(slot)
+        self._words[h] = self._words[h + 1] = 0
+        self._slots[addr] = slot
+        return slot
+
+    def _evict(self, now):
+        # Free the slots of clients that have not been sampled for a full ring.
+        cutoff = now - self.step * self.depth
+        w = self._words
+        for addr, slot in list(self._slots.items()):
+            h = self._header(slot)
+            if w[h + 1] == 0 or w[self._sample(slot, w[h] - 1)] < cutoff:
+                del self._slots[addr]
+                off = (self._slot_base + slot * self._SLOT_WORDS) * 4
+                self._buf[off:off + self._ADDR_BYTES] = bytes(self._ADDR_BYTES)
+                self._free.append(slot)
+
+    def ingest(self, rows, now) -> bool:
+        """Append one sample per row if ``step`` seconds passed since the last one."""
+        if now - self._last_sample < self.step:
+            return False
+        self._last_sample = now
+        t = int(now)
+        w, tails, slots = self._words, self._tails, self._slots
+        depth, nwin, fields = self.depth, len(self.windows), self._FIELDS
+        slot_base, slot_words, sample_base = self._slot_base, self._SLOT_WORDS, self._sample_base
+        seq_word = self._ADDR_BYTES // 4
+        starts = [t - win for win in self.windows]
+        rates = {}
+        with self._lock:
+            for row in rows:
+                addr = row_key(row)
+                slot = slots.get(addr)
+                if slot is None:
+                    slot = self._allocate(addr, t)
+                    if slot is None:
+                        continue
+                h = slot_base + slot * slot_words + seq_word
+                ring = sample_base + slot * depth * fields
+                seq, count = w[h], w[h + 1]
+                ntp, drop, cmd = row["NTP"] & 0xFFFFFFFF, row["Drop"] & 0xFFFFFFFF, row["Cmd"] & 0xFFFFFFFF
+                if count:
+                    last = ring + (seq - 1) % depth * fields
+                    if ntp < w[last + 1] or drop < w[last + 2]:
+                        count = 0  # counters went backwards: chronyd restarted
+                i = ring + seq % depth * fields
+                w[i], w[i + 1], w[i + 2], w[i + 3] = t, ntp, drop, cmd
+                seq += 1
+                count = min(count + 1, depth)
+                w[h], w[h + 1] = seq, count
+                oldest, newest = seq - count, seq - 1
+                ti = slot * nwin
+                for start in starts:
+                    tail = tails[ti]
+                    if not oldest <= tail <= newest:
+                        tail = oldest
+                    # The window starts at the newest sample that is at least
+                    # as old as the window (or the oldest one we have).
+                    while tail != newest and w[ring + (tail + 1) % depth * fields] <= start:
+                        tail += 1
+                    tails[ti] = tail
+                    ti += 1
+                rates[addr] = self._rate(slot, 0)
+            self._rates = rates
+        return True
+
+    def _rate(self, slot, k):
+        w = self._words
+        h = self._header(slot)
+        seq, count = w[h], w[h + 1]
+        if count < 2:
+            return None
+        tail = self._tails[slot * len(self.windows) + k]
+        if not seq - count <= tail < seq:
+            tail = seq - count
+        b = self._sample(slot, seq - 1)
+        a = self._sample(slot, tail)
+        dt = w[b] - w[a]
+        if dt <= 0:
+            return None
+        dn, dd = w[b + 1] - w[a + 1], w[b + 2] - w[a + 2]
+        return {
+            "pps": round(dn / dt, 3),
+            "dps": round(dd / dt, 3),
+            "drop_ratio": round(dd / dn, 4) if dn else 0.0,
+        }
+
+    _NO_RATE = {"pps": None, "dps": None, "drop_ratio": None}
+
+    def annotate(self, rows):
+        """Add packets/s, drops/s and drop ratio over the first window to ``rows``."""
+        rates = self._rates
+        for row in rows:
+            row.update(rates.get(row_key(row)) or self._NO_RATE)
+
+    def history(self, addr):
+        with self._lock:
+            slot = self._slots.get(addr)
+            if slot is None:
+                return None
+            w = self._words
+            h = self._header(slot)
+            seq, count = w[h], w[h + 1]
+            samples = []
+            for s in range(seq - count, seq):
+                i = self._sample(slot, s)
+                samples.append([w[i], w[i + 1], w[i + 2], w[i + 3]])
+            rates = {str(win): self._rate(slot, k) for k, win in enumerate(self.windows)}
+        return {"addr": addr, "step": self.step, "fields": ["time", "NTP", "Drop", "Cmd"],
+                "samples": samples, "rates": rates}
+
+def _ensure_private_dir(path):
+    # STATE_DIR defaults to a predictable path under /tmp: only trust a
+    # directory that the current user owns and nobody else can write to.
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.stat(path)
+    if st.st_uid != os.getuid():
+        raise PermissionError(f"{path} is not owned by the current user")
+    if st.st_mode & 0o022:
+        raise PermissionError(f"{path} is writable by other users")
+
+class SnapshotCollector:
+    """Runs chronyc on an interval and serves every reader from the latest snapshot.
+
+    Exactly one process per STATE_DIR (the holder of ``collector.lock``) runs
+    chronyc and publishes the snapshot to ``snapshot.json`` whenever its
+    version changes, plus a small ``snapshot.meta`` heartbeat on every run;
+    every other gunicorn worker only follows those files. Concurrent
+    refreshes inside a process are merged into a single run. Under the ASGI
+    app, start_async() runs it from the event loop instead of a thread.
+    """
+
+    def __init__(self, collect, interval=POLL_INTERVAL, state_dir=STATE_DIR, history=DELTA_HISTORY,
+                 client_history=None, history_path=None, stats=None, resolver=None):
+        self._collect = collect
+        self.resolver = resolver
+        self._stats = stats if stats is not None else {}
+        self._leader_stats = {}
+        self._leader_errors = 0
+        self.errors = 0
+        self.client_history = client_history
+        self.history_path = history_path
+        self.interval = interval
+        self.state_dir = state_dir
+        self._snapshot_path = os.path.join(state_dir, "snapshot.json")
+        self._meta_path = os.path.join(state_dir, "snapshot.meta")
+        self._lock_path = os.path.join(state_dir, "collector.lock")
+        self._refresh_lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._generation = 0
+        self._snapshot = None
+        self._history = deque(maxlen=max(1, history))
+        self._lock_fd = None
+        self._pid = None
+        self._loop = None
+        self._async_changed = None
+        self._task = None
 
-def get_local_time():
-    return datetime.now().strftime("%d-%m-%Y, %H:%M:%S")
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_fd is not None
+
+    def start(self):
+        # Started lazily and re-started after a fork (gunicorn --preload).
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._lock_fd = None
+        t = threading.Thread(target=self._run, name="ticc-collector", daemon=True)
+        t.start()
+
+    def start_async(self, collect):
+        """Run from the current event loop: ``collect`` is a coroutine function
+        returning what the ``collect`` callable does, and the rest of every
+        refresh runs in the loop's default executor."""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._lock_fd = None
+        self._loop = asyncio.get_running_loop()
+        self._async_changed = asyncio.Event()
+        self._task = self._loop.create_task(self._run_async(collect))
+
+    def stop_async(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self) -> Snapshot:
+        self.start()
+        snap = self._snapshot
+        if snap is None:
+            if self._loop is None:
+                snap = self.refresh()
+            else:
+                snap = self.wait_for_change(None, BACKEND_TIMEOUT + 1) or self._placeholder()
+        return snap
+
+    async def snapshot_async(self) -> Snapshot:
+        snap = self._snapshot
+        if snap is None:
+            snap = await self.wait_for_change_async(None, BACKEND_TIMEOUT + 1) or self._placeholder()
+        return snap
+
+    @staticmethod
+    def _placeholder() -> Snapshot:
+        return Snapshot([], 0, "Error: no answer from chronyd yet", time.time())
+
+    def wait_for_change(self, snap: Snapshot, timeout: float) -> Snapshot:
+        """Block until a snapshot other than ``snap`` is published or ``timeout`` passes."""
+        self.start()
+        with self._changed:
+            self._changed.wait_for(lambda: self._snapshot is not snap, timeout)
+            return self._snapshot
+
+    async def wait_for_change_async(self, snap: Snapshot, timeout: float) -> Snapshot:
+        """wait_for_change() for coroutines on the loop given to start_async()."""
+        changed = self._async_changed
+        if self._snapshot is snap:
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._snapshot
+
+    def stats(self):
+        """Collector timing histograms and error count of whichever process collects."""
+        if self.is_leader:
+            return self._stats, self.errors
+        return self._leader_stats, self._leader_errors
+
+    def version(self, epoch: str, version: int):
+        """A retained snapshot by (epoch, version), or None once it aged out."""
+        for snap in reversed(self._history):
+            if snap.version == version and snap.epoch == epoch:
+                return snap
+        return None
+
+    def refresh(self, result=None) -> Snapshot:
+        # ``result`` is an already collected client table (see _poll()).
+        gen = self._generation
+        with self._refresh_lock:
+            if self._generation != gen and self._snapshot is not None:
+                # Another thread finished a refresh while we were waiting.
+                return self._snapshot
+            if self._try_lead():
+                snap = self._collect_now(result)
+                self._write_shared(snap)
+            else:
+                snap = self._read_shared()
+                if snap is None:
+                    if self._snapshot is not None:
+                        return self._snapshot
+                    # No leader output yet (first start): collect once
+                    # locally, unversioned so it never enters the history.
+                    parsed, count, err, servers = self._poll(result)
+                    now = time.time()
+                    self._annotate(parsed, now)
+                    snap = Snapshot(parsed, count, err, now, servers=servers)
+                elif snap.version and self.client_history is not None:
+                    # Rates already come with the leader's rows; sample them
+                    # here too so /history works on every worker.
+                    self.client_history.ingest(snap.clients, snap.taken_at)
+            self._publish(snap)
+            self._generation += 1
+            return snap
+
+    def _publish(self, snap: Snapshot):
+        if snap is self._snapshot:
+            return
+        if snap.version and (not self._history or self._history[-1].epoch != snap.epoch):
+            self._history.clear()
+        if snap.version:
+            self._history.append(snap)
+        with self._changed:
+            self._snapshot = snap
+            self._changed.notify_all()
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wake_async)
+            except RuntimeError:  # the loop is closed
+                pass
+
+    def _wake_async(self):
+        self._async_changed.set()
+        self._async_changed = asyncio.Event()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                log.exception("snapshot refresh failed")
+            time.sleep(self.interval)
+
+    async def _run_async(self, collect):
+        while True:
+            try:
+                # Followers only read the leader's files, unless there is
+                # nothing to show yet.
+                result = await collect() if self._try_lead() or self._snapshot is None else None
+                await self._loop.run_in_executor(None, self.refresh, result)
+            except Exception:
+                log.exception("snapshot refresh failed")
+            await asyncio.sleep(self.interval)
+
+    def _annotate(self, rows, now):
+        t0 = time.perf_counter()
+        prev = self._snapshot
+        stamp_last_seen(rows, now, prev.by_key() if prev is not None else None)
+        if self.resolver is not None:
+            self.resolver.annotate(rows)
+        store = self.client_history
+        if store is not None:
+            store.ingest(rows, now)
+            store.annotate(rows)
+        for row in rows:
+            row["severity"] = severity(row)
+        self._stats.setdefault("annotate", Histogram()).observe(time.perf_counter() - t0)
+
+    def _poll(self, result=None):
+        # ``collect`` returns (rows, count, error), plus the server status
+        # list when it polls a fleet.
+        if result is None:
+            result = self._collect()
+        return result if len(result) == 4 else (*result, None)
+
+    def _collect_now(self, result=None) -> Snapshot:
+        parsed, count, err, servers = self._poll(result)
+        now = time.time()
+        if err or any(s["error"] for s in servers or ()):
+            self.errors += 1
+        prev = self._snapshot
+        if err and prev is not None and prev.version and prev.clients:
+            # Keep serving the last good table, marked stale, rather than an
+            # empty one; its taken_at (and so its age) stays that of the table.
+            if prev.stale and prev.error == err and prev.servers == servers:
+                return prev
+            return Snapshot(prev.clients, prev.count, err, prev.taken_at, prev.epoch, prev.version + 1,
+                            servers=servers, stale=True)
+        self._annotate(parsed, now)
+        if prev is not None and prev.version and prev.same_content(parsed, err, servers):
+            prev.taken_at = now
+            return prev
+        if prev is not None and prev.version:
+            epoch, version = prev.epoch, prev.version
+        else:
+            epoch, version = self._read_meta() or (secrets.token_hex(4), 0)
+        return Snapshot(parsed, count, err, now, epoch, version + 1, servers=servers)
+
+    def _ensure_state_dir(self):
+        _ensure_private_dir(self.state_dir)
+
+    def _try_lead(self) -> bool:
+        if self._lock_fd is not None:
+            return True
+        try:
+            self._ensure_state_dir()
+            fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError:
+            log.exception("cannot open collector lock, collecting per process")
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        if self.history_path and self.client_history is not None:
+            # Only the collector owns the persistent history file.
+            try:
+                self.client_history = self.client_history.reopen(self.history_path)
+            except OSError:
+                log.exception("cannot open history file, keeping history in memory")
+        return True
+
+    def _write_atomic(self, path, obj):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(obj, fh, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def _write_shared(self, snap: Snapshot):
+        if self._lock_fd is None:
+            return
+        try:
+            if snap is not self._snapshot:
+                self._write_atomic(self._snapshot_path, snap.to_dict())
+            self._write_atomic(self._meta_path, {
+                "epoch": snap.epoch, "version": snap.version, "taken_at": snap.taken_at,
+                "stats": {k: h.to_dict() for k, h in self._stats.items()}, "errors": self.errors,
+            })
+        except OSError:
+            log.exception("cannot write shared snapshot")
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path) as fh:
+                meta = json.load(fh)
+            return meta["epoch"], meta["version"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _read_shared(self):
+        try:
+            with open(self._meta_path) as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        try:
+            self._leader_stats = {k: Histogram.from_dict(v) for k, v in meta.get("stats", {}).items()}
+            self._leader_errors = meta.get("errors", 0)
+        except (KeyError, TypeError):
+            pass
+        cur = self._snapshot
+        if cur is not None and cur.version == meta.get("version") and cur.epoch == meta.get("epoch"):
+            cur.taken_at = meta.get("taken_at", cur.taken_at)
+            return cur
+        try:
+            with open(self._snapshot_path) as fh:
+                return Snapshot.from_dict(json.load(fh))
+        except (OSError, ValueError, KeyError):
+            return None
+
+fleet = FleetPoller([ChronyServer(s) for s in SERVERS.split(",") if s.strip()],
+                    stats=collector_stats) if SERVERS else None
+
+collector = SnapshotCollector(
+    fleet or get_chrony_clients,
+    client_history=HistoryStore(HISTORY_DEPTH, HISTORY_MAX_CLIENTS, HISTORY_STEP, RATE_WINDOWS),
+    history_path=HISTORY_PATH,
+    stats=collector_stats,
+    resolver=make_resolver(RESOLVER),
+)
+
+def _snapshot_fields(snap: Snapshot):
+    # Everything in a /data body must depend on the snapshot version only,
+    # so that its ETag stays valid; the page clock ticks in the browser.
+    fields = {
+        "count": snap.count,
+        "epoch": snap.epoch,
+        "version": snap.version,
+        "local_time": get_local_time(snap.updated_at),
+        "utc_offset": time.localtime(snap.updated_at).tm_gmtoff,
+    }
+    if snap.servers is not None:
+        fields["servers"] = snap.server_summaries()
+        fields["fleet_summary"] = snap.select()[1]
+    if snap.stale:
+        fields.update(stale=True, collected_time=get_local_time(snap.taken_at))
+    return fields
+
+def _cache_headers(resp, snap: Snapshot, variant=""):
+    # ``variant`` tells representations of the same snapshot apart (format
+    # and content coding), so every one of them has its own strong ETag.
+    if snap.version:
+        resp.set_etag(snap.etag + variant)
+        resp.headers["Cache-Control"] = "no-cache"
+    else:
+        resp.headers["Cache-Control"] = "no-store"
+    resp.headers["X-Snapshot-Age"] = f"{snap.age():.3f}"
+    return resp
+
+def _parse_since(raw):
+    """(epoch, version) from ``since``: a snapshot's ETag (<epoch>-<version>,
+    quotes and format suffixes allowed) or, without an epoch, a bare version."""
+    if raw is None:
+        return None
+    epoch, sep, rest = raw.strip().removeprefix("W/").strip('"').partition("-")
+    if not sep:
+        epoch, rest = None, epoch
+    try:
+        return epoch, int(rest.partition("-")[0])
+    except ValueError:
+        raise ValueError("since must be a snapshot ETag (<epoch>-<version>)") from None
+
+def _delta_payload(snap: Snapshot, since):
+    # Versions only compare within one epoch: a version of another collector
+    # lifetime (or one given without its epoch) gets the full table.
+    epoch, version = since
+    if epoch != snap.epoch:
+        return None
+    if version == snap.version:
+        delta = {"added": [], "changed": [], "removed": []}
+    else:
+        old = collector.version(snap.epoch, version) if 0 < version < snap.version else None
+        if old is None:
+            return None
+        delta = snap.derived(f"delta:{version}", lambda s: diff_snapshots(old, s))
+    payload = _snapshot_fields(snap)
+    payload.update(delta, since=f"{epoch}-{version}", summary=snap.select()[1])
+    return payload
+
+def _view_params():
+    # The (mode, query, server, offset, limit) view of /data and /stream;
+    # the query is normalized so that equal views share their cache entries.
+    mode = request.args.get("sort") or None
+    if mode is not None and mode not in SORT_MODES:
+        raise ValueError(f"sort must be one of {', '.join(SORT_MODES)}")
+    query = request.args.get("q", "").strip().lower()
+    server = request.args.get("server") or None
+    offset = max(0, request.args.get("offset", 0, type=int))
+    limit = request.args.get("limit", None, type=int)
+    return mode, query, server, offset, limit
+
+def _page_payload(snap: Snapshot, mode, query, server, offset, limit):
+    order, summary = snap.select(mode, query, server)
+    end = len(order) if limit is None else offset + max(0, limit)
+    rows = snap.clients
+    payload = _snapshot_fields(snap)
+    payload.update({
+        "clients_parsed": [rows[i] for i in order[offset:end]],
+        "filtered": len(order),
+        "offset": offset,
+        "summary": summary,
+    })
+    if snap.error:
+        payload["error"] = snap.error
+    return payload
+
+# /data representations: format name -> media type. "columns" and "msgpack"
+# send every row list as one column list plus an array of values per column.
+DATA_FORMATS = {
+    "json": "application/json",
+    "columns": "application/vnd.ticc.columns+json",
+    "msgpack": "application/msgpack",
+}
+CLIENT_COLUMNS = ("addr", "hostname", "NTP", "Drop", "Int", "IntL", "last_seen", "Cmd", "pps", "dps", "drop_ratio", "severity")
+# Bodies smaller than this are not worth gzipping.
+GZIP_MIN_BYTES = 1024
+
+def _data_format() -> str:
+    fmt = request.args.get("format")
+    if fmt is None:
+        # "application/json" comes first, so */* keeps getting plain JSON.
+        accepted = request.accept_mimetypes
+        best = accepted.best_match(list(DATA_FORMATS.values()) + ["application/x-msgpack"])
+        fmt = "msgpack" if best == "application/x-msgpack" else next(
+            (k for k, v in DATA_FORMATS.items() if v == best), "json")
+    if fmt not in DATA_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(DATA_FORMATS)}")
+    return fmt
+
+def _columnar(rows, fleet: bool):
+    columns = CLIENT_COLUMNS + ("server",) if fleet else CLIENT_COLUMNS
+    return {"columns": columns, "data": [[r.get(c) for r in rows] for c in columns]}
+
+def _encode_payload(payload, fmt: str, fleet: bool) -> bytes:
+    with timed("encode"):
+        if fmt == "json":
+            return (app.json.dumps(payload, separators=(",", ":")) + "\n").encode()
+        payload = dict(payload)
+        for key in ("clients_parsed", "added", "changed"):
+            if key in payload:
+                payload[key] = _columnar(payload[key], fleet)
+        if fmt == "msgpack":
+            return msgpack.packb(payload)
+        return json.dumps(payload, separators=(",", ":")).encode()
+
+def _data_payload(snap: Snapshot, view, since):
+    payload = _delta_payload(snap, since) if since is not None else None
+    if payload is None:
+        payload = _page_payload(snap, *view)
+        if since is not None:
+            # The requested version is no longer retained (or is from
+            # another epoch): send everything.
+            payload["full"] = True
+    elif snap.error:
+        payload["error"] = snap.error
+    return payload
+
+def _data_body(snap: Snapshot, view, since, fmt: str, coding: str) -> bytes:
+    # Serialized (and compressed) once per snapshot and request shape, then
+    # shared by every reader of that snapshot.
+    key = ("data", view, since, fmt)
+    if coding == "gzip":
+        def compress(s):
+            body = _data_body(s, view, since, fmt, "")
+            with timed("gzip"):
+                return gzip.compress(body, 6)
+        return snap.view_cached(key + ("gzip",), compress)
+
+    def build(s):
+        # "page" includes the sort and search stages it triggers.
+        with timed("page"):
+            payload = _data_payload(s, view, since)
+        return _encode_payload(payload, fmt, s.servers is not None)
+    return snap.view_cached(key, build)
 
 @app.route("/data")
 def data():
-    parsed, count, err = get_chrony_clients()
-    payload = {
-        "clients_parsed": parsed,
-        "count": count,
-        "local_time": get_local_time(),
-    }
-    if err:
-        payload["error"] = err
-    return jsonify(payload)
+    try:
+        view = _view_params()
+        fmt = _data_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if fmt == "msgpack" and msgpack is None:
+        return jsonify({"error": "msgpack is not installed on the server"}), 406
+    try:
+        since = _parse_since(request.args.get("since"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-@app.route("/")
-def dashboard():
-    html = """
-    <!DOCTYPE html>
-    <html lang="en" data-bs-theme="dark">
-    <head>
-        <meta charset="UTF-8"/>
-        <meta name="viewport" content="width=device-width, initial-scale=1"/>
-        <title>TICC-DASH | Time Information of Chrony Clients – Dashboard</title>
-
-        <!-- Favicons -->
-        <link rel="icon" type="image/png" href="/static/img/favicon.png"/>
-        <link rel="icon" type="image/png" href="/static/img/ticc-dash-logo.png"/>
-
-        <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css"/>
-        <script src="https://code.jquery.com/jquery-3.6.0.min.js"></script>
-        <style>
-            :root{
-                --ok:#198754; --warn:#ffc107; --bad:#dc3545;
-                --bg:#0f1720; --card:#1f2630; --text-dim:#9aa3ad;
-                --border: rgba(255,255,255,.10); --row-sep: rgba(255,255,255,.06);
-                --tile-bg: rgba(255,255,255,0.06); --detail-bg: rgba(255,255,255,0.03);
-                --title-color:#8be1dd; --toolbar-bg: rgba(18,22,28,.65);
-                --toolbar-border: rgba(255,255,255,.12);
-                --pill-bg: rgba(255,255,255,.04); --pill-border: rgba(255,255,255,.08);
-                --info-bg: #0ea5e9; --info-btn-size: 22px;
-            }
-            html[data-bs-theme="light"]{
-                --bg:#eef2f3; --card:#ffffff; --text-dim:#475569;
-                --border: rgba(0,0,0,.12); --row-sep: rgba(0,0,0,.06);
-                --tile-bg: rgba(0,0,0,0.06); --detail-bg: rgba(0,0,0,0.03);
-                --title-color:#2c7a7b; --toolbar-bg: rgba(255,255,255,.85);
-                --toolbar-border: rgba(0,0,0,.12); --pill-bg: rgba(0,0,0,.03);
-                --pill-border: rgba(0,0,0,.08); --info-bg: #0284c7;
-            }
-
-            body { font-family: system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif; background: var(--bg); }
-            .page { max-width: 1100px; margin: 0 auto; padding: 12px 16px 28px; }
-
-            /* Brand header with logo + centered title */
-            .brand-wrap{
-                display:flex; align-items:center; justify-content:center;
-                gap: 12px; margin-top: 12px; margin-bottom: 2px;
-            }
-            .brand-logo{
-                height: 68px; width: auto; object-fit: contain; user-select:none;
-                filter: drop-shadow(0 2px 8px rgba(0,0,0,.12));
-            }
-            @media (max-width: 600px){
-                .brand-logo{ height: 56px; }
-            }
-            .brand-wrap .title{
-                font-weight:800; font-size: clamp(1.9rem, 1.2rem + 1.8vw, 2.8rem);
-                letter-spacing:.3px; color: var(--title-color);
-                text-shadow: 0 2px 12px rgba(0,0,0,.18);
-            }
-
-            .subtitle{ text-align:center; margin-top:2px; color: var(--text-dim); margin-bottom: 22px; }
-            .datetime-block{ text-align:center; font-size: 1.15rem; font-weight: 700; letter-spacing: .2px; }
-            .datetime-block .sep{ display:block; height:4px; }
-
-            .toolbar { position: fixed; right: 16px; top: 12px; z-index: 1000; display:flex; align-items:center; gap:10px;
-                padding: 6px 10px; border-radius: 999px; background: var(--toolbar-bg); border: 1px solid var(--toolbar-border);
-                box-shadow: 0 8px 24px rgba(0,0,0,.25); backdrop-filter: blur(8px);
-            }
-            .switch { display:flex; align-items:center; gap:8px; user-select:none; }
-            .switch input { display:none; }
-            .slider { position: relative; width: 46px; height: 22px; background: #cbd5e1; border-radius: 999px; cursor: pointer; transition: .25s; box-shadow: inset 0 0 0 1px rgba(0,0,0,.06); }
-            .slider::before{ content: ""; position: absolute; height: 18px; width: 18px; left: 2px; bottom: 2px; background: #fff; border-radius: 50%; transition: .25s; box-shadow: 0 1px 2px rgba(0,0,0,.25); }
-            .switch input:checked + .slider { background:#64748b; } .switch input:checked + .slider::before { transform: translateX(24px); }
-            .ico{ width:18px; height:18px; opacity:.9; }
-            .info-wrap{ position: relative; }
-            .info-btn{ width: var(--info-btn-size); height: var(--info-btn-size); border-radius:50%; display:flex; align-items:center; justify-content:center;
-                background: var(--info-bg); color:#fff; font-weight:800; cursor:pointer; box-shadow: 0 3px 10px rgba(0,0,0,.2); user-select:none; line-height:1; }
-            .info-pop{ position:absolute; right: 0; top: 42px; min-width: 260px; max-width: 320px; background: var(--card); border: 1px solid var(--border);
-                color: inherit; border-radius: 10px; padding: 10px 12px; box-shadow: 0 10px 26px rgba(0,0,0,.28); display:none; z-index: 3000; }
-            .info-pop:after{ content:""; position:absolute; top:-8px; right: calc(var(--info-btn-size) / 2); width:0;height:0;
-                border-left:8px solid transparent; border-right:8px solid transparent; border-bottom:8px solid var(--card);
-                filter: drop-shadow(0 -1px 0 var(--border)); }
-            .info-pop a{ color: inherit; text-decoration: underline; }
-
-            .subinfo { text-align:center; margin-bottom: 6px; line-height: 1.45rem; }
-            .badge-clients { font-size: .95rem; border-radius: 999px; padding: .45rem .75rem; font-weight:700; }
-            .summary-bar { display:flex; gap:10px; justify-content:center; align-items:center; flex-wrap:wrap; margin-top: 18px; margin-bottom: 48px; }
-            .summary-pill{ display:inline-flex; align-items:center; gap:8px; font-size: .92rem; line-height: 1.2rem; padding: 4px 10px; border-radius: 999px;
-                background: var(--pill-bg); border: 1px solid var(--pill-border); color: inherit; font-weight: 600; }
-            .summary-pill::before{ content:""; width:9px; height:9px; border-radius:50%; background: currentColor; }
-            .pill-ok{ color: var(--ok); } .pill-warn{ color: #b88400; } .pill-bad{ color: #b02a37; }
-
-            .controls{ display:flex; gap:8px; justify-content:center; align-items:center; flex-wrap:wrap; margin-top: 6px; margin-bottom: 10px; }
-            .controls .form-select { width: 260px; } .controls .form-control { width: min(420px, 58vw); }
-
-            .table-wrap{ padding: 0; }
-            .client-table{ font-size:.95rem; border-collapse: separate; border-spacing: 0; border-radius: 12px; overflow:hidden; background: var(--card);
-                box-shadow: 0 8px 24px rgba(0,0,0,.18); }
-            .client-table thead th{ background: transparent; font-weight:700; border-bottom: 1px solid var(--border); }
-            .client-table tbody td{ border-top: 1px solid var(--row-sep); }
-            .client-table tbody tr td, .client-table thead th{ padding: .48rem .6rem; }
-            .addr-cell{ font-weight:700; white-space:nowrap; overflow:hidden; text-overflow:ellipsis; }
-            .td-num{ text-align:right; font-variant-numeric: tabular-nums; white-space:nowrap; }
-            .last-cell{ white-space:nowrap; }
-            .caret-cell{ width:30px; text-align:center; cursor:pointer; } .caret{ user-select:none; }
-            .sev-0{ border-left: 6px solid var(--ok); } .sev-1{ border-left: 6px solid var(--warn); } .sev-2{ border-left: 6px solid var(--bad); }
-            .detail-row td{ padding: .75rem .6rem; background: var(--detail-bg); }
-            .metrics{ display:grid; grid-template-columns: repeat(3, minmax(0, 1fr)); gap:12px; }
-            @media (max-width: 900px){ .metrics{ grid-template-columns: repeat(2, minmax(0,1fr)); } }
-            @media (max-width: 560px){ .metrics{ grid-template-columns: repeat(1, minmax(0,1fr)); } }
-            .metric{ border-radius:10px; background: var(--tile-bg); padding:10px 12px; display:flex; align-items:center; justify-content:space-between; min-height:56px; gap:10px; }
-            .metric .label{ font-weight:600; display:flex; align-items:center; gap:8px; opacity:.95; }
-            .metric .value{ font-variant-numeric: tabular-nums; font-weight:600; }
-        </style>
-    </head>
-    <body>
-        <!-- Toolbar -->
-        <div class="toolbar" id="toolbar">
-            <label class="switch expand" title="Expand/Collapse all">
-                <svg class="ico" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                    <rect x="3" y="3" width="7" height="7" rx="1"></rect>
-                    <rect x="14" y="3" width="7" height="7" rx="1"></rect>
-                    <rect x="3" y="14" width="7" height="7" rx="1"></rect>
-                </svg>
-                <input type="checkbox" id="expand-toggle"><span class="slider"></span>
-            </label>
-            <label class="switch theme" title="Light/Dark theme">
-                <svg class="ico" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                    <path d="M12 3v2M12 19v2M4.22 4.22l1.42 1.42M18.36 18.36l1.42 1.42M3 12h2M19 12h2M4.22 19.78l1.42-1.42M18.36 5.64l1.42-1.42"></path>
-                    <circle cx="12" cy="12" r="5"></circle>
-                </svg>
-                <input type="checkbox" id="theme-toggle"><span class="slider"></span>
-            </label>
-            <div class="info-wrap">
-                <div class="info-btn" id="infoBtn" title="Project info">i</div>
-                <div class="info-pop" id="infoPop">
-                    <strong>TICC-DASH</strong><br/>
-                    More information: <a href="https://ticc-dash.org" target="_blank" rel="noopener">ticc-dash.org</a>
-                </div>
+    with timed("snapshot"):
+        snap = collector.snapshot()
+    body = _data_body(snap, view, since, fmt, "")
+    coding = "gzip" if len(body) >= GZIP_MIN_BYTES and request.accept_encodings["gzip"] else ""
+    variant = ("" if fmt == "json" else f"-{fmt}") + ("-gzip" if coding else "")
+    if snap.version and request.if_none_match.contains(snap.etag + variant):
+        resp = Response(status=304)
+    else:
+        resp = Response(_data_body(snap, view, since, fmt, coding) if coding else body, mimetype=DATA_FORMATS[fmt])
+        if coding:
+            resp.headers["Content-Encoding"] = coding
+    resp.vary.update(("Accept", "Accept-Encoding"))
+    return _cache_headers(resp, snap, variant)
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+def _stream_snapshot_event(snap: Snapshot, view):
+    # Encoded once per snapshot and view, then shared by every connection.
+    return snap.view_cached(("sse-snapshot", view), lambda s: _sse("snapshot", _page_payload(s, *view)))
+
+def _stream_change_event(old: Snapshot, new: Snapshot, view):
+    def build(s):
+        old_page = _page_payload(old, *view)["clients_parsed"]
+        payload = _page_payload(s, *view)
+        delta = diff_pages(old_page, payload.pop("clients_parsed"))
+        payload.update(delta, since=old.etag)
+        return _sse("change", payload)
+    return new.view_cached(("sse-change", old.etag, view), build)
+
+def _stream_heartbeat(snap: Snapshot) -> str:
+    return _sse("heartbeat", {"server_time": time.time(), "age": round(snap.age(), 3)})
+
+def _stream_open(snap: Snapshot, view) -> str:
+    # What a /stream connection starts with.
+    return "retry: 3000\n" + _stream_snapshot_event(snap, view) + _stream_heartbeat(snap)
+
+def _stream_next(snap: Snapshot, new: Snapshot, view) -> str:
+    # What follows ``snap`` once wait_for_change() returned ``new``: a
+    # heartbeat when nothing changed, the new page when the version sequence
+    # restarted, and the change otherwise.
+    if new is snap:
+        return _stream_heartbeat(snap)
+    if new.epoch != snap.epoch or not new.version:
+        return _stream_snapshot_event(new, view)
+    return _stream_change_event(snap, new, view)
+
+@app.route("/stream")
+def stream():
+    """Server-Sent Events: a "snapshot" event for the requested view on
+    connect, a "change" event whenever the collected table changes and a
+    "heartbeat" every SSE_HEARTBEAT seconds while idle."""
+    try:
+        view = _view_params()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def events():
+        snap = collector.snapshot()
+        yield _stream_open(snap, view)
+        while True:
+            new = collector.wait_for_change(snap, SSE_HEARTBEAT)
+            yield _stream_next(snap, new, view)
+            snap = new
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers=headers)
+
+@app.route("/history/<path:addr>")
+def client_history(addr):
+    # In fleet mode the client's server is given as ?server=<name>.
+    collector.start()
+    store = collector.client_history
+    server = request.args.get("server") or None
+    hist = store.history(row_key({"addr": addr, "server": server})) if store is not None else None
+    if hist is None:
+        return jsonify({"error": f"no history for {addr}"}), 404
+    hist.update(addr=addr, server=server)
+    resp = jsonify(hist)
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+_CLIENT_METRICS = (
+    ("ticc_client_ntp_packets_total", "counter", "NTP packets received from the client.", "NTP"),
+    ("ticc_client_ntp_drops_total", "counter", "NTP packets from the client that were dropped.", "Drop"),
+    ("ticc_client_cmd_packets_total", "counter", "Command packets received from the client.", "Cmd"),
+    ("ticc_client_last_seen_timestamp_seconds", "gauge", "Unix time of the last NTP packet from the client.",
+     "last_seen"),
+    ("ticc_client_ntp_packets_per_second", "gauge", "NTP packets per second over the first rate window.", "pps"),
+    ("ticc_client_drop_ratio", "gauge", "Share of NTP packets dropped over the first rate window.", "drop_ratio"),
+)
+
+def metrics_client_order(spec: str):
+    # TICC_METRICS_CLIENT_ORDER as the Snapshot.order() mode that picks the series.
+    if spec == "drops":
+        return "drop_desc"
+    if spec == "address":
+        return None
+    raise ValueError(f"TICC_METRICS_CLIENT_ORDER must be drops or address, not {spec!r}")
+
+_METRICS_ORDER = metrics_client_order(METRICS_CLIENT_ORDER)
+
+def _render_snapshot_metrics(snap: Snapshot) -> str:
+    out = []
+    summary = snap.select()[1]
+    out.append("# HELP ticc_clients Clients in the snapshot by status.\n# TYPE ticc_clients gauge\n")
+    for label in SEVERITY_LABELS:
+        out.append(f'ticc_clients{{status="{label}"}} {summary[label]}\n')
+    out.append(f"# HELP ticc_snapshot_version Version of the current snapshot.\n# TYPE ticc_snapshot_version gauge\n"
+               f"ticc_snapshot_version {snap.version}\n"
+               f"# HELP ticc_snapshot_stale Whether collections fail and the last good table is served.\n"
+               f"# TYPE ticc_snapshot_stale gauge\nticc_snapshot_stale {int(snap.stale)}\n")
+    if snap.servers is not None:
+        out.append("# HELP ticc_server_up Whether the server answered the last collection.\n# TYPE ticc_server_up gauge\n")
+        out.extend(f'ticc_server_up{{server="{_label(s["name"])}"}} {0 if s["error"] else 1}\n' for s in snap.servers)
+        out.append("# HELP ticc_server_clients Clients reported by the server.\n# TYPE ticc_server_clients gauge\n")
+        out.extend(f'ticc_server_clients{{server="{_label(s["name"])}"}} {s["count"]}\n' for s in snap.servers)
+
+    if METRICS_MAX_CLIENTS > 0:
+        order = snap.order(_METRICS_ORDER)
+        picked = [snap.clients[i] for i in order[:METRICS_MAX_CLIENTS]]
+        labels = [f'{{client="{_label(r["addr"])}",server="{_label(r["server"])}"}}' if "server" in r
+                  else f'{{client="{_label(r["addr"])}"}}' for r in picked]
+        for name, kind, help_text, field in _CLIENT_METRICS:
+            out.append(f"# HELP {name} {help_text}\n# TYPE {name} {kind}\n")
+            out.extend(f"{name}{lab} {r[field]}\n" for lab, r in zip(labels, picked) if r.get(field) is not None)
+        omitted = len(order) - len(picked)
+    else:
+        omitted = snap.count
+    out.append("# HELP ticc_client_series_omitted Clients left out of the per-client series by the cap.\n"
+               f"# TYPE ticc_client_series_omitted gauge\nticc_client_series_omitted {omitted}\n")
+    return "".join(out)
+
+def _render_histogram(name: str, help_text: str, hists) -> str:
+    # ``hists`` maps a rendered label set ("" for none) to its Histogram.
+    out = [f"# HELP {name} {help_text}\n# TYPE {name} histogram\n"]
+    for labels, hist in hists.items():
+        sep, suffix = (",", f"{{{labels}}}") if labels else ("", "")
+        cumulative = 0
+        for le, n in zip(Histogram.BUCKETS + ("+Inf",), hist.counts):
+            cumulative += n
+            out.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {cumulative}\n')
+        out.append(f"{name}_sum{suffix} {hist.sum}\n{name}_count{suffix} {cumulative}\n")
+    return "".join(out)
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus text exposition (format 0.0.4)."""
+    snap = collector.snapshot()
+    stats, errors = collector.stats()
+    parts = [snap.derived("metrics", _render_snapshot_metrics)]
+    if "backend" in stats:
+        parts.append(_render_histogram("ticc_collector_backend_seconds",
+                                       "Time spent querying chronyd (socket or chronyc).", {"": stats["backend"]}))
+    if "parse" in stats:
+        parts.append(_render_histogram("ticc_collector_parse_seconds",
+                                       "Time spent parsing and sorting the client table.", {"": stats["parse"]}))
+    if "annotate" in stats:
+        parts.append(_render_histogram("ticc_collector_annotate_seconds",
+                                       "Time spent updating the client history and rates.", {"": stats["annotate"]}))
+    if "dns" in stats and stats["dns"].count:
+        parts.append(_render_histogram("ticc_dns_lookup_seconds",
+                                       "Time spent on reverse lookups of client addresses.", {"": stats["dns"]}))
+    per_server = {f'server="{_label(k[7:])}"': h for k, h in stats.items() if k.startswith("server:")}
+    if per_server:
+        parts.append(_render_histogram("ticc_server_poll_seconds",
+                                       "Time spent collecting the client table of each fleet server.", per_server))
+    parts.append(f"# HELP ticc_collector_errors_total Collections that failed.\n# TYPE ticc_collector_errors_total counter\n"
+                 f"ticc_collector_errors_total {errors}\n"
+                 f"# HELP ticc_snapshot_age_seconds Seconds since the snapshot was collected.\n# TYPE ticc_snapshot_age_seconds gauge\n"
+                 f"ticc_snapshot_age_seconds {snap.age():.3f}\n")
+    return Response("".join(parts), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Collector stages reported in every Server-Timing header, as measured by
+# the last collection.
+_COLLECTOR_TIMING = ("backend", "parse", "annotate")
+
+@app.before_request
+def _start_timing():
+    if PERF_TIMING:
+        g.perf_t0 = time.perf_counter()
+        _request_timings.set({})
+
+@app.after_request
+def _server_timing(resp):
+    t0 = g.pop("perf_t0", None)
+    if t0 is None:
+        return resp
+    total = time.perf_counter() - t0
+    endpoint = request.endpoint or "unmatched"
+    hist = route_stats.get(endpoint)
+    if hist is None:
+        hist = route_stats.setdefault(endpoint, StageHistogram())
+    hist.observe(total)
+    timings = _request_timings.get() or {}
+    stats = collector.stats()[0]
+    entries = [f'{k};dur={stats[k].last * 1e3:.3f};desc="last collection"'
+               for k in _COLLECTOR_TIMING if k in stats and stats[k].last is not None]
+    entries.extend(f"{k};dur={v * 1e3:.3f}" for k, v in timings.items())
+    entries.append(f"total;dur={total * 1e3:.3f}")
+    resp.headers["Server-Timing"] = ", ".join(entries)
+    return resp
+
+def _stage_summary(hist: Histogram):
+    ms = lambda v: None if v is None else round(v * 1e3, 3)
+    n = hist.count
+    return {"count": n, "mean_ms": ms(hist.sum / n if n else None), "p50_ms": ms(hist.quantile(0.5)),
+            "p90_ms": ms(hist.quantile(0.9)), "p99_ms": ms(hist.quantile(0.99)), "last_ms": ms(hist.last)}
+
+@app.route("/debug/perf")
+def debug_perf():
+    """Stage latencies (percentiles are estimated from histogram buckets),
+    call counts, snapshot age and cache hit ratios. The collector stages come
+    from whichever process collects; request stages, routes and caches are
+    those of the worker that answers."""
+    snap = collector.snapshot()
+    stats, errors = collector.stats()
+    caches = {}
+    for name, (hits, misses) in cache_stats.items():
+        total = hits + misses
+        caches[name] = {"hits": hits, "misses": misses, "hit_ratio": round(hits / total, 4) if total else None}
+    resp = jsonify({
+        "pid": os.getpid(),
+        "leader": collector.is_leader,
+        "snapshot": {"version": snap.version, "epoch": snap.epoch, "count": snap.count,
+                     "age_s": round(snap.age(), 3), "interval_s": collector.interval},
+        "collector": {k: _stage_summary(h) for k, h in stats.items()},
+        "collector_errors": errors,
+        "stages": {k: _stage_summary(h) for k, h in request_stats.items()},
+        "routes": {k: _stage_summary(h) for k, h in route_stats.items()},
+        "caches": caches,
+        "resolver": collector.resolver.stats() if collector.resolver is not None else None,
+        "timing": PERF_TIMING,
+        "profiler": PROFILER,
+    })
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+class SamplingProfiler:
+    """Samples the Python stacks of this process' threads ``hz`` times a second.
+
+    Stacks are counted in collapsed form, one ``thread;frame;...;frame count``
+    line each, which flamegraph.pl and speedscope read directly. Nothing is
+    sampled outside of run().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def run(self, seconds: float, hz: float, thread_prefix=""):
+        """Samples for ``seconds`` in the calling thread; None if a run is already going."""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            me = threading.get_ident()
+            counts = {}
+            labels = {}
+            interval = 1.0 / hz
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    name = names.get(ident, str(ident))
+                    if ident == me or not name.startswith(thread_prefix):
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        label = labels.get(code)
+                        if label is None:
+                            label = labels[code] = (f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                                                    f"{code.co_firstlineno})").replace(";", ":")
+                        stack.append(label)
+                        frame = frame.f_back
+                    stack.append(name.replace(";", ":"))
+                    key = ";".join(reversed(stack))
+                    counts[key] = counts.get(key, 0) + 1
+                time.sleep(interval)
+            return counts
+        finally:
+            self._lock.release()
+
+profiler = SamplingProfiler()
+
+@app.route("/debug/profile")
+def debug_profile():
+    """Profile this worker for ``seconds`` (default 10, at most 60) at ``hz``
+    samples per second (default 100), optionally only the threads whose name
+    starts with ``thread`` (the collector is "ticc-collector"). Only with
+    TICC_PROFILER=1."""
+    if not PROFILER:
+        return jsonify({"error": "the profiler is off (TICC_PROFILER=1 enables it)"}), 404
+    seconds = min(60.0, max(0.1, request.args.get("seconds", 10.0, type=float)))
+    hz = min(1000.0, max(1.0, request.args.get("hz", 100.0, type=float)))
+    collector.start()
+    counts = profiler.run(seconds, hz, request.args.get("thread", ""))
+    if counts is None:
+        return jsonify({"error": "a profile is already being taken"}), 409
+    body = "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items(), key=lambda kv: -kv[1]))
+    resp = Response(body, mimetype="text/plain")
+    resp.headers["Cache-Control"] = "no-store"
+    resp.headers["X-Collector-Leader"] = "1" if collector.is_leader else "0"
+    return resp
+
+# Vendored front-end libraries; the CDN is only used when a file is missing.
+VENDOR_ASSETS = {
+    "bootstrap.min.css": "https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css",
+    "jquery.min.js": "https://code.jquery.com/jquery-3.6.0.min.js",
+}
+_MIMETYPES = {".css": "text/css", ".js": "text/javascript", ".html": "text/html", ".png": "image/png"}
+
+class Asset:
+    __slots__ = ("url", "mimetype", "etag", "variants")
+
+    def __init__(self, url, mimetype, etag, variants):
+        self.url = url
+        self.mimetype = mimetype
+        self.etag = etag
+        self.variants = variants  # content-coding -> body
+
+class AssetBundle:
+    """The dashboard page and every file it loads, built once per process.
+
+    Assets are served from content-hashed URLs (/assets/<name>.<hash>.<ext>)
+    and are precompressed with gzip and, when the module is installed,
+    brotli. Compressed bodies are cached in ``cache_dir`` by content hash,
+    so only the first worker after an upgrade compresses at the best level.
+    The cache is only used when it and its parent are private to the
+    current user, and a cached body is only served if it decompresses to
+    the asset.
+    """
+
+    def __init__(self, static_dir, cache_dir):
+        self.static_dir = static_dir
+        self.cache_dir = cache_dir
+        try:
+            _ensure_private_dir(os.path.dirname(cache_dir))
+            _ensure_private_dir(cache_dir)
+        except OSError as e:
+            log.warning("not caching compressed assets: %s", e)
+            self.cache_dir = None
+        self.assets = {}
+        self.urls = {}
+        for name, cdn in VENDOR_ASSETS.items():
+            self._add_file(name, os.path.join(static_dir, "vendor", name), cdn)
+        self._add_file("ticc-dash-logo.png", os.path.join(static_dir, "img", "ticc-dash-logo.png"),
+                       "/static/img/ticc-dash-logo.png")
+        self._add("dashboard.css", DASHBOARD_CSS.encode())
+        self._add("dashboard.js", DASHBOARD_JS.encode())
+        html = app.jinja_env.from_string(DASHBOARD_HTML).render(asset=self.urls.__getitem__)
+        self.page = self._build("/", ".html", html.encode())
+
+    def _add_file(self, name, path, fallback_url):
+        try:
+            with open(path, "rb") as fh:
+                data = fh.read()
+        except OSError:
+            log.warning("%s not found, the page links %s instead", path, fallback_url)
+            self.urls[name] = fallback_url
+            return
+        self._add(name, data)
+
+    def _add(self, name, data):
+        stem, ext = os.path.splitext(name)
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        url = f"/assets/{stem}.{digest}{ext}"
+        self.assets[url.rsplit("/", 1)[1]] = self._build(url, ext, data, digest)
+        self.urls[name] = url
+
+    def _build(self, url, ext, data, digest=None):
+        digest = digest or hashlib.sha256(data).hexdigest()[:16]
+        variants = {"identity": data}
+        if ext != ".png":
+            variants["gzip"] = self._compressed(digest, "gz", data, lambda d: gzip.compress(d, 9, mtime=0),
+                                                gzip.decompress)
+            if brotli is not None:
+                variants["br"] = self._compressed(digest, "br", data, lambda d: brotli.compress(d, quality=11),
+                                                  brotli.decompress)
+        return Asset(url, _MIMETYPES.get(ext, "application/octet-stream"), digest, variants)
+
+    def _compressed(self, digest, suffix, data, compress, decompress):
+        if self.cache_dir is None:
+            return compress(data)
+        path = os.path.join(self.cache_dir, f"{digest}.{suffix}")
+        try:
+            with open(path, "rb") as fh:
+                body = fh.read()
+            if decompress(body) == data:
+                return body
+            log.warning("ignoring %s, it does not match the asset", path)
+        except Exception:
+            pass
+        body = compress(data)
+        try:
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as fh:
+                fh.write(body)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+        return body
+
+_assets = None
+_assets_lock = threading.Lock()
+
+def assets() -> AssetBundle:
+    global _assets
+    if _assets is None:
+        with _assets_lock:
+            if _assets is None:
+                _assets = AssetBundle(app.static_folder, os.path.join(STATE_DIR, "assets"))
+    return _assets
+
+def _send_asset(asset: Asset, cache_control: str):
+    accepted = request.accept_encodings
+    encoding = next((e for e in ("br", "gzip") if e in asset.variants and accepted[e]), "identity")
+    # One strong ETag per representation, as each encoding is a different body.
+    etag = asset.etag if encoding == "identity" else f"{asset.etag}-{encoding}"
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(asset.variants[encoding], mimetype=asset.mimetype)
+        if encoding != "identity":
+            resp.headers["Content-Encoding"] = encoding
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = cache_control
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
+
+@app.route("/assets/<name>")
+def asset(name):
+    found = assets().assets.get(name)
+    if found is None:
+        return Response("Not Found", status=404, mimetype="text/plain")
+    return _send_asset(found, "public, max-age=31536000, immutable")
+
+DASHBOARD_HTML = """
+<!DOCTYPE html>
+<html lang="en" data-bs-theme="dark">
+<head>
+    <meta charset="UTF-8"/>
+    <meta name="viewport" content="width=device-width, initial-scale=1"/>
+    <title>TICC-DASH | Time Information of Chrony Clients – Dashboard</title>
+
+    <!-- Favicons -->
+    <link rel="icon" type="image/png" href="/static/img/favicon.png"/>
+    <link rel="icon" type="image/png" href="{{ asset('ticc-dash-logo.png') }}"/>
+
+    <link rel="stylesheet" href="{{ asset('bootstrap.min.css') }}"/>
+    <script src="{{ asset('jquery.min.js') }}"></script>
+    <link rel="stylesheet" href="{{ asset('dashboard.css') }}"/>
+</head>
+<body>
+    <!-- Toolbar -->
+    <div class="toolbar" id="toolbar">
+        <label class="switch expand" title="Expand/Collapse all">
+            <svg class="ico" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
+                <rect x="3" y="3" width="7" height="7" rx="1"></rect>
+                <rect x="14" y="3" width="7" height="7" rx="1"></rect>
+                <rect x="3" y="14" width="7" height="7" rx="1"></rect>
+            </svg>
+            <input type="checkbox" id="expand-toggle"><span class="slider"></span>
+        </label>
+        <label class="switch theme" title="Light/Dark theme">
+            <svg class="ico" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
+                <path d="M12 3v2M12 19v2M4.22 4.22l1.42 1.42M18.36 18.36l1.42 1.42M3 12h2M19 12h2M4.22 19.78l1.42-1.42M18.36 5.64l1.42-1.42"></path>
+                <circle cx="12" cy="12" r="5"></circle>
+            </svg>
+            <input type="checkbox" id="theme-toggle"><span class="slider"></span>
+        </label>
+        <div class="info-wrap">
+            <div class="info-btn" id="infoBtn" title="Project info">i</div>
+            <div class="info-pop" id="infoPop">
+                <strong>TICC-DASH</strong><br/>
+                More information: <a href="https://ticc-dash.org" target="_blank" rel="noopener">ticc-dash.org</a>
             </div>
         </div>
+    </div>
 
-        <div class="page">
-            <!-- Brand header (logo + title remain centered together) -->
-            <div class="brand-wrap">
-                <img class="brand-logo" src="/static/img/ticc-dash-logo.png" alt="TICC-DASH Logo" />
-                <div class="title">TICC-DASH</div>
-            </div>
-            <div class="subtitle">Time Information of Chrony Clients – Dashboard</div>
+    <div class="page">
+        <!-- Brand header (logo + title remain centered together) -->
+        <div class="brand-wrap">
+            <img class="brand-logo" src="{{ asset('ticc-dash-logo.png') }}" alt="TICC-DASH Logo" />
+            <div class="title">TICC-DASH</div>
+        </div>
+        <div class="subtitle">Time Information of Chrony Clients – Dashboard</div>
 
-            <div class="datetime-block">
-                <div>Date: <span id="date-part">--</span></div>
-                <span class="sep"></span>
-                <div>Time: <span id="time-part">--</span></div>
-            </div>
+        <div class="datetime-block">
+            <div>Date: <span id="date-part">--</span></div>
+            <span class="sep"></span>
+            <div>Time: <span id="time-part">--</span></div>
+        </div>
 
-            <div style="height:14px"></div>
-            <div class="subinfo">
-                <span class="badge bg-primary badge-clients">Clients: <span id="clients-count">0</span></span>
-            </div>
+        <div style="height:14px"></div>
+        <div class="subinfo">
+            <span class="badge bg-primary badge-clients">Clients: <span id="clients-count">0</span></span>
+        </div>
 
-            <div class="summary-bar">
-                <span class="summary-pill pill-ok">OK: <span id="count-ok">0</span></span>
-                <span class="summary-pill pill-warn">Warning: <span id="count-warn">0</span></span>
-                <span class="summary-pill pill-bad">Critical: <span id="count-bad">0</span></span>
-            </div>
+        <div class="summary-bar">
+            <span class="summary-pill pill-ok">OK: <span id="count-ok">0</span></span>
+            <span class="summary-pill pill-warn">Warning: <span id="count-warn">0</span></span>
+            <span class="summary-pill pill-bad">Critical: <span id="count-bad">0</span></span>
+        </div>
+        <div class="server-bar" id="server-bar"></div>
+        <div class="stale-note" id="stale-note"></div>
 
-            <div class="controls">
-                <select id="sort-select" class="form-select" title="Sort clients">
-                    <option value="ip_order">Sort by: IP Address (IPv4 numeric, then others)</option>
-                    <option value="drop_desc">Sort by: Drop Count (high → low)</option>
-                    <option value="last_recent">Sort by: Last Seen (recent → old)</option>
-                </select>
-                <input id="search" type="text" class="form-control" placeholder="Search clients..."/>
-            </div>
+        <div class="controls">
+            <select id="sort-select" class="form-select" title="Sort clients">
+                <option value="ip_order">Sort by: IP Address (IPv4 numeric, then others)</option>
+                <option value="drop_desc">Sort by: Drop Count (high → low)</option>
+                <option value="last_recent">Sort by: Last Seen (recent → old)</option>
+            </select>
+            <select id="server-select" class="form-select" title="Filter by server" style="display:none">
+                <option value="">All servers</option>
+            </select>
+            <input id="search" type="text" class="form-control" placeholder="Search clients..."/>
+        </div>
 
-            <div class="table-wrap">
-                <table class="table table-hover align-middle client-table">
-                    <colgroup>
-                        <col style="width:32px" />
-                        <col />
-                        <col style="width:120px" />
-                        <col style="width:84px" />
-                        <col style="width:84px" />
-                        <col style="width:84px" />
-                        <col style="width:96px" />
-                        <col style="width:160px" />
-                    </colgroup>
-                    <thead>
-                        <tr>
-                            <th class="caret-cell"></th>
-                            <th>Address</th>
-                            <th class="text-center">Status</th>
-                            <th class="text-end">NTP</th>
-                            <th class="text-end">Drop</th>
-                            <th class="text-end">Cmd</th>
-                            <th class="text-end">Interval</th>
-                            <th>Last Seen</th>
-                        </tr>
-                    </thead>
-                    <tbody id="client-tbody"></tbody>
-                </table>
-            </div>
+        <div class="table-wrap">
+            <table class="table table-hover align-middle client-table">
+                <colgroup>
+                    <col style="width:32px" />
+                    <col />
+                    <col style="width:120px" />
+                    <col style="width:84px" />
+                    <col style="width:84px" />
+                    <col style="width:84px" />
+                    <col style="width:96px" />
+                    <col style="width:160px" />
+                </colgroup>
+                <thead>
+                    <tr>
+                        <th class="caret-cell"></th>
+                        <th>Address</th>
+                        <th class="text-center">Status</th>
+                        <th class="text-end">NTP</th>
+                        <th class="text-end">Drop</th>
+                        <th class="text-end">Cmd</th>
+                        <th class="text-end">Interval</th>
+                        <th>Last Seen</th>
+                    </tr>
+                </thead>
+                <tbody id="client-tbody"></tbody>
+            </table>
+        </div>
+        <div class="pager">
+            <button id="page-prev" class="btn btn-sm btn-outline-secondary" type="button">‹ Prev</button>
+            <span id="page-info" class="pager-info">0–0 of 0</span>
+            <button id="page-next" class="btn btn-sm btn-outline-secondary" type="button">Next ›</button>
         </div>
+    </div>
 
-        <script>
-            function applyTheme(theme){
-                $("html").attr("data-bs-theme", theme);
-                $("#theme-toggle").prop("checked", theme === "dark");
-            }
-            const THEME_KEY="ticc_dash_theme", OPEN_KEY="ticc_dash_open_rows";
-            const savedTheme=localStorage.getItem(THEME_KEY)||"dark"; applyTheme(savedTheme);
-            $("#theme-toggle").on("change", function(){ const t=this.checked?"dark":"light"; localStorage.setItem(THEME_KEY,t); applyTheme(t); });
-
-            const infoBtn=document.getElementById("infoBtn"), infoPop=document.getElementById("infoPop");
-            infoBtn.addEventListener("click",(e)=>{e.stopPropagation(); infoPop.style.display = infoPop.style.display==="block"?"none":"block";});
-            document.addEventListener("click",(e)=>{ if(!infoPop.contains(e.target) && e.target!==infoBtn){ infoPop.style.display="none"; } });
-
-            function toInt(v){ const n=parseInt(v,10); return isNaN(n)?0:n; }
-            function lastToSeconds(raw){
-                if(!raw) return null; const s=String(raw).trim().toLowerCase();
-                if (s==="-"||s==="?"||s==="") return null;
-                if (/^\\d+$/.test(s)) return parseInt(s,10);
-                const m=s.match(/^(\\d+(?:\\.\\d+)?)\\s*([a-z]+)$/i); if(!m) return null;
-                const num=parseFloat(m[1]), unit=m[2];
-                if(["s","sec","secs","second","seconds"].includes(unit)) return num;
-                if(["m","min","mins","minute","minutes"].includes(unit)) return num*60;
-                if(["h","hr","hrs","hour","hours"].includes(unit)) return num*3600;
-                if(["d","day","days"].includes(unit)) return num*86400;
-                return null;
-            }
-            function humanLast(raw){ const sec=lastToSeconds(raw); if(sec===null) return raw||"-"; if(sec<60) return Math.floor(sec)+" sec ago"; const m=Math.floor(sec/60); if(m<60) return m+" min ago"; const h=Math.floor(m/60); if(h<24) return h+" hr ago"; return Math.floor(h/24)+" d ago"; }
-            function severity(r){ const d=toInt(r.Drop); if(d>=10) return 2; if(d>0) return 1; return 0; }
-            function sevLabel(s){ return s===2?"Critical":(s===1?"Warning":"OK"); }
-            function iconForAddr(a){ if(/^\\d+\\.\\d+\\.\\d+\\.\\d+$/.test(a)) return "🌐"; if(/^[0-9a-fA-F:]+$/.test(a)) return "🔗"; return "💻"; }
-
-            function loadOpenSet(){ try{ return new Set(JSON.parse(localStorage.getItem(OPEN_KEY)||"[]")); }catch(e){ return new Set(); } }
-            function saveOpenSet(s){ try{ localStorage.setItem(OPEN_KEY, JSON.stringify([...s])); }catch(e){} }
-            let openSet=loadOpenSet();
-
-            function ipTuple(a){ if(!/^\\d+\\.\\d+\\.\\d+\\.\\d+$/.test(a)) return null; return a.split(".").map(n=>parseInt(n,10)); }
-            function sortRows(rows, mode){
-                if(mode==="ip_order"){
-                    rows.sort((a,b)=>{ const A=ipTuple(a.addr||""),B=ipTuple(b.addr||""); if(A&&B){ for(let i=0;i<4;i++){ if(A[i]!=B[i]) return A[i]-B[i]; } return 0; } if(A&&!B) return -1; if(!A&&B) return 1; return (a.addr||"").toLowerCase().localeCompare((b.addr||"").toLowerCase()); });
-                } else if(mode==="drop_desc"){ rows.sort((a,b)=> toInt(b.Drop)-toInt(a.Drop)); }
-                else if(mode==="last_recent"){ rows.sort((a,b)=>{ const as=lastToSeconds(a.Last), bs=lastToSeconds(b.Last); if(as===null&&bs===null) return 0; if(as===null) return 1; if(bs===null) return -1; return as-bs; }); }
-                return rows;
-            }
-
-            function updateSummary(rows){ let ok=0,w=0,b=0; rows.forEach(r=>{ const s=severity(r); if(s===0) ok++; else if(s===1) w++; else b++; }); $("#count-ok").text(ok); $("#count-warn").text(w); $("#count-bad").text(b); }
-
-            function detailHTML(r){ return `
-                <tr class="detail-row" data-detail-for="${r.addr}"><td></td><td colspan="7">
-                    <div class="metrics">
-                        <div class="metric"><div class="label">🕙 NTP Packets</div><div class="value">${r.NTP||"-"}</div></div>
-                        <div class="metric"><div class="label">📉 Dropped Packets</div><div class="value">${r.Drop||"-"}</div></div>
-                        <div class="metric"><div class="label">📨 Command Packets</div><div class="value">${r.Cmd||"-"}</div></div>
-                        <div class="metric"><div class="label">🔄 Interval</div><div class="value">${r.Int||"-"}</div></div>
-                        <div class="metric"><div class="label">👁️ Last Seen</div><div class="value">${humanLast(r.Last)}</div></div>
-                    </div>
-                </td></tr>`; }
-            function rowHTML(r){ const sev=severity(r), addr=r.addr||"", open=openSet.has(addr), caret=open?"▲":"▼"; return `
-                <tr class="client-row sev-${sev}" data-addr="${addr}">
-                    <td class="caret-cell"><span class="caret">${caret}</span></td>
-                    <td class="addr-cell" title="${addr}">${iconForAddr(addr)}&nbsp; ${addr}</td>
-                    <td class="text-center">${sevLabel(sev)}</td>
-                    <td class="td-num">${r.NTP||"-"}</td><td class="td-num">${r.Drop||"-"}</td><td class="td-num">${r.Cmd||"-"}</td><td class="td-num">${r.Int||"-"}</td>
-                    <td class="last-cell">${humanLast(r.Last)}</td>
-                </tr>${open?detailHTML(r):""}`; }
-
-            function updateExpandToggleVisual(){ const total=$("#client-tbody .client-row").length; const openCnt=openSet.size; $("#expand-toggle").prop("checked", total>0 && openCnt===total); }
-
-            function bindHandlers(){
-                $("#client-tbody .client-row").off("click").on("click", function(e){
-                    if($(e.target).closest("a,button,select,input,label").length) return;
-                    const $row=$(this), addr=$row.data("addr"), isOpen=openSet.has(addr);
-                    if(isOpen){ $row.find(".caret").text("▼"); $(`tr.detail-row[data-detail-for="${addr}"]`).remove(); openSet.delete(addr); }
-                    else { $row.find(".caret").text("▲"); $(detailHTML(cache.find(r=>r.addr===addr))).insertAfter($row); openSet.add(addr); }
-                    saveOpenSet(openSet); updateExpandToggleVisual();
-                });
-
-                $("#expand-toggle").off("change").on("change", function(){
-                    if(this.checked){
-                        $("#client-tbody .client-row").each(function(){ const $r=$(this), a=$r.data("addr"); if(!openSet.has(a)){ $r.find(".caret").text("▲"); $(detailHTML(cache.find(r=>r.addr===a))).insertAfter($r); openSet.add(a); }});
-                    }else{
-                        $("#client-tbody .client-row .caret").text("▼"); $("#client-tbody tr.detail-row").remove(); openSet=new Set();
-                    }
-                    saveOpenSet(openSet); updateExpandToggleVisual();
-                });
-            }
-
-            let cache=[], lastHash="";
-            function computeHash(rows){ return rows.map(r=>[r.addr,r.NTP,r.Drop,r.Int,r.Last,r.Cmd].join("|")).join("~"); }
-
-            function render(){
-                const q=$("#search").val().trim().toLowerCase(), mode=$("#sort-select").val();
-                let rows=cache.filter(r=> !q || JSON.stringify(r).toLowerCase().includes(q));
-                rows=sortRows(rows,mode); updateSummary(rows);
-                $("#client-tbody").html(rows.map(rowHTML).join("")); bindHandlers(); updateExpandToggleVisual();
-            }
-
-            function refresh(){
-                $.getJSON("/data", function(payload){
-                    const y=window.scrollY;
-                    const [d,t]=(payload.local_time||"").split(", "); $("#date-part").text(d||"--"); $("#time-part").text(t||"--");
-                    $("#clients-count").text(payload.count||0);
-                    const rows=payload.clients_parsed||[], h=computeHash(rows);
-                    if(h!==lastHash){ cache=rows; render(); lastHash=h; } else { updateSummary(cache); }
-                    if(window.scrollY!==y) window.scrollTo(0,y);
-                });
-            }
-            $(function(){ $("#sort-select").on("change",render); $("#search").on("input",render); refresh(); setInterval(refresh,1000); });
-        </script>
-    </body>
-    </html>
-    """
-    return render_template_string(html)
+    <script src="{{ asset('dashboard.js') }}"></script>
+</body>
+</html>
+"""
+
+DASHBOARD_CSS = """
+:root{
+    --ok:#198754; --warn:#ffc107; --bad:#dc3545;
+    --bg:#0f1720; --card:#1f2630; --text-dim:#9aa3ad;
+    --border: rgba(255,255,255,.10); --row-sep: rgba(255,255,255,.06);
+    --tile-bg: rgba(255,255,255,0.06); --detail-bg: rgba(255,255,255,0.03);
+    --title-color:#8be1dd; --toolbar-bg: rgba(18,22,28,.65);
+    --toolbar-border: rgba(255,255,255,.12);
+    --pill-bg: rgba(255,255,255,.04); --pill-border: rgba(255,255,255,.08);
+    --info-bg: #0ea5e9; --info-btn-size: 22px;
+}
+html[data-bs-theme="light"]{
+    --bg:#eef2f3; --card:#ffffff; --text-dim:#475569;
+    --border: rgba(0,0,0,.12); --row-sep: rgba(0,0,0,.06);
+    --tile-bg: rgba(0,0,0,0.06); --detail-bg: rgba(0,0,0,0.03);
+    --title-color:#2c7a7b; --toolbar-bg: rgba(255,255,255,.85);
+    --toolbar-border: rgba(0,0,0,.12); --pill-bg: rgba(0,0,0,.03);
+    --pill-border: rgba(0,0,0,.08); --info-bg: #0284c7;
+}
+
+body { font-family: system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif; background: var(--bg); }
+.page { max-width: 1100px; margin: 0 auto; padding: 12px 16px 28px; }
+
+/* Brand header with logo + centered title */
+.brand-wrap{
+    display:flex; align-items:center; justify-content:center;
+    gap: 12px; margin-top: 12px; margin-bottom: 2px;
+}
+.brand-logo{
+    height: 68px; width: auto; object-fit: contain; user-select:none;
+    filter: drop-shadow(0 2px 8px rgba(0,0,0,.12));
+}
+@media (max-width: 600px){
+    .brand-logo{ height: 56px; }
+}
+.brand-wrap .title{
+    font-weight:800; font-size: clamp(1.9rem, 1.2rem + 1.8vw, 2.8rem);
+    letter-spacing:.3px; color: var(--title-color);
+    text-shadow: 0 2px 12px rgba(0,0,0,.18);
+}
+
+.subtitle{ text-align:center; margin-top:2px; color: var(--text-dim); margin-bottom: 22px; }
+.datetime-block{ text-align:center; font-size: 1.15rem; font-weight: 700; letter-spacing: .2px; }
+.datetime-block .sep{ display:block; height:4px; }
+
+.toolbar { position: fixed; right: 16px; top: 12px; z-index: 1000; display:flex; align-items:center; gap:10px;
+    padding: 6px 10px; border-radius: 999px; background: var(--toolbar-bg); border: 1px solid var(--toolbar-border);
+    box-shadow: 0 8px 24px rgba(0,0,0,.25); backdrop-filter: blur(8px);
+}
+.switch { display:flex; align-items:center; gap:8px; user-select:none; }
+.switch input { display:none; }
+.slider { position: relative; width: 46px; height: 22px; background: #cbd5e1; border-radius: 999px; cursor: pointer; transition: .25s; box-shadow: inset 0 0 0 1px rgba(0,0,0,.06); }
+.slider::before{ content: ""; position: absolute; height: 18px; width: 18px; left: 2px; bottom: 2px; background: #fff; border-radius: 50%; transition: .25s; box-shadow: 0 1px 2px rgba(0,0,0,.25); }
+.switch input:checked + .slider { background:#64748b; } .switch input:checked + .slider::before { transform: translateX(24px); }
+.ico{ width:18px; height:18px; opacity:.9; }
+.info-wrap{ position: relative; }
+.info-btn{ width: var(--info-btn-size); height: var(--info-btn-size); border-radius:50%; display:flex; align-items:center; justify-content:center;
+    background: var(--info-bg); color:#fff; font-weight:800; cursor:pointer; box-shadow: 0 3px 10px rgba(0,0,0,.2); user-select:none; line-height:1; }
+.info-pop{ position:absolute; right: 0; top: 42px; min-width: 260px; max-width: 320px; background: var(--card); border: 1px solid var(--border);
+    color: inherit; border-radius: 10px; padding: 10px 12px; box-shadow: 0 10px 26px rgba(0,0,0,.28); display:none; z-index: 3000; }
+.info-pop:after{ content:""; position:absolute; top:-8px; right: calc(var(--info-btn-size) / 2); width:0;height:0;
+    border-left:8px solid transparent; border-right:8px solid transparent; border-bottom:8px solid var(--card);
+    filter: drop-shadow(0 -1px 0 var(--border)); }
+.info-pop a{ color: inherit; text-decoration: underline; }
+
+.subinfo { text-align:center; margin-bottom: 6px; line-height: 1.45rem; }
+.badge-clients { font-size: .95rem; border-radius: 999px; padding: .45rem .75rem; font-weight:700; }
+.summary-bar { display:flex; gap:10px; justify-content:center; align-items:center; flex-wrap:wrap; margin-top: 18px; margin-bottom: 48px; }
+.summary-pill{ display:inline-flex; align-items:center; gap:8px; font-size: .92rem; line-height: 1.2rem; padding: 4px 10px; border-radius: 999px;
+    background: var(--pill-bg); border: 1px solid var(--pill-border); color: inherit; font-weight: 600; }
+.summary-pill::before{ content:""; width:9px; height:9px; border-radius:50%; background: currentColor; }
+.pill-ok{ color: var(--ok); } .pill-warn{ color: #b88400; } .pill-bad{ color: #b02a37; }
+.stale-note{ display:none; text-align:center; color:#f59e0b; font-size:.9rem; margin:-18px auto 24px; max-width:900px; }
+.server-bar{ display:none; gap:8px; justify-content:center; flex-wrap:wrap; margin-top: -30px; margin-bottom: 30px; }
+.host-name{ font-size:.8rem; color: var(--text-dim); margin-left: 8px; }
+.server-badge{ font-size:.75rem; font-weight:600; color: var(--text-dim); margin-left: 6px; }
+
+.controls{ display:flex; gap:8px; justify-content:center; align-items:center; flex-wrap:wrap; margin-top: 6px; margin-bottom: 10px; }
+.controls .form-select { width: 260px; } .controls .form-control { width: min(420px, 58vw); }
+
+.table-wrap{ padding: 0; }
+.pager{ display:flex; gap:10px; justify-content:center; align-items:center; margin-top: 12px; }
+.pager-info{ color: var(--text-dim); font-variant-numeric: tabular-nums; min-width: 140px; text-align:center; }
+.client-table{ font-size:.95rem; border-collapse: separate; border-spacing: 0; border-radius: 12px; overflow:hidden; background: var(--card);
+    box-shadow: 0 8px 24px rgba(0,0,0,.18); }
+.client-table thead th{ background: transparent; font-weight:700; border-bottom: 1px solid var(--border); }
+.client-table tbody td{ border-top: 1px solid var(--row-sep); }
+.client-table tbody tr td, .client-table thead th{ padding: .48rem .6rem; }
+.addr-cell{ font-weight:700; white-space:nowrap; overflow:hidden; text-overflow:ellipsis; }
+.td-num{ text-align:right; font-variant-numeric: tabular-nums; white-space:nowrap; }
+.last-cell{ white-space:nowrap; }
+.caret-cell{ width:30px; text-align:center; cursor:pointer; user-select:none; }
+.client-row{ cursor:pointer; }
+.client-table tbody tr.spacer-row > td{ padding:0; border:0; box-shadow:none !important; }
+.sev-0{ border-left: 6px solid var(--ok); } .sev-1{ border-left: 6px solid var(--warn); } .sev-2{ border-left: 6px solid var(--bad); }
+.detail-row td{ padding: .75rem .6rem; background: var(--detail-bg); }
+.metrics{ display:grid; grid-template-columns: repeat(3, minmax(0, 1fr)); gap:12px; }
+@media (max-width: 900px){ .metrics{ grid-template-columns: repeat(2, minmax(0,1fr)); } }
+@media (max-width: 560px){ .metrics{ grid-template-columns: repeat(1, minmax(0,1fr)); } }
+.metric{ border-radius:10px; background: var(--tile-bg); padding:10px 12px; display:flex; align-items:center; justify-content:space-between; min-height:56px; gap:10px; }
+.metric .label{ font-weight:600; display:flex; align-items:center; gap:8px; opacity:.95; }
+.metric .value{ font-variant-numeric: tabular-nums; font-weight:600; }
+"""
+
+DASHBOARD_JS = """
+function applyTheme(theme){
+    $("html").attr("data-bs-theme", theme);
+    $("#theme-toggle").prop("checked", theme === "dark");
+}
+const THEME_KEY="ticc_dash_theme", OPEN_KEY="ticc_dash_open_rows";
+const savedTheme=localStorage.getItem(THEME_KEY)||"dark"; applyTheme(savedTheme);
+$("#theme-toggle").on("change", function(){ const t=this.checked?"dark":"light"; localStorage.setItem(THEME_KEY,t); applyTheme(t); });
+
+const infoBtn=document.getElementById("infoBtn"), infoPop=document.getElementById("infoPop");
+infoBtn.addEventListener("click",(e)=>{e.stopPropagation(); infoPop.style.display = infoPop.style.display==="block"?"none":"block";});
+document.addEventListener("click",(e)=>{ if(!infoPop.contains(e.target) && e.target!==infoBtn){ infoPop.style.display="none"; } });
+
+function toInt(v){ const n=parseInt(v,10); return isNaN(n)?0:n; }
+function val(v){ return (v===null||v===undefined||v==="")?"-":v; }
+// Rows carry the absolute time of the last packet; its age is counted here, on the server's clock.
+function humanLast(seen){ if(seen===null||seen===undefined) return "-"; const sec=Math.max(0,(Date.now()+clockSkew)/1000-seen); if(sec<60) return Math.floor(sec)+" sec ago"; const m=Math.floor(sec/60); if(m<60) return m+" min ago"; const h=Math.floor(m/60); if(h<24) return h+" hr ago"; return Math.floor(h/24)+" d ago"; }
+function severity(r){ if(r.severity!==undefined) return r.severity; const d=toInt(r.Drop); if(d>=10) return 2; if(d>0) return 1; return 0; }
+function rate(v, unit){ return (v===null||v===undefined)?"-":v+unit; }
+function sevLabel(s){ return s===2?"Critical":(s===1?"Warning":"OK"); }
+function iconForAddr(a){ if(/^\\d+\\.\\d+\\.\\d+\\.\\d+$/.test(a)) return "🌐"; if(/^[0-9a-fA-F:]+$/.test(a)) return "🔗"; return "💻"; }
+
+function loadOpenSet(){ try{ return new Set(JSON.parse(localStorage.getItem(OPEN_KEY)||"[]")); }catch(e){ return new Set(); } }
+function saveOpenSet(s){ try{ localStorage.setItem(OPEN_KEY, JSON.stringify([...s])); }catch(e){} }
+let openSet=loadOpenSet();
+
+function updateSummary(s){ $("#count-ok").text(s.ok||0); $("#count-warn").text(s.warning||0); $("#count-bad").text(s.critical||0); }
+// Rows are identified by address, or by server and address when a fleet is polled.
+function rowKey(r){ return r.server!==undefined ? r.server+"|"+r.addr : r.addr; }
+
+let serverNames="";
+function updateServers(list){
+    if(!list){ $("#server-bar, #server-select").hide(); return; }
+    const names=list.map(s=>s.name).join("\\n");
+    if(names!==serverNames){
+        serverNames=names;
+        const $sel=$("#server-select"), cur=$sel.val();
+        $sel.find("option:not(:first)").remove();
+        list.forEach(s=>$sel.append($("<option>").val(s.name).text("Server: "+s.name)));
+        $sel.val(list.some(s=>s.name===cur)?cur:"").show();
+    }
+    $("#server-bar").css("display","flex").empty().append(list.map(s=>{
+        const sum=s.summary||{}, cls=s.error?"pill-bad":(sum.critical?"pill-warn":"pill-ok");
+        return $("<span>").addClass("summary-pill "+cls).attr("title",s.error||s.endpoint)
+            .text(`${s.name}: ${s.error?"unreachable":s.count+" clients"}`);
+    }));
+}
+
+function detailCells(r){ return `
+    <td></td><td colspan="7">
+        <div class="metrics">
+            <div class="metric"><div class="label">🕙 NTP Packets</div><div class="value">${val(r.NTP)}</div></div>
+            <div class="metric"><div class="label">📉 Dropped Packets</div><div class="value">${val(r.Drop)}</div></div>
+            <div class="metric"><div class="label">📨 Command Packets</div><div class="value">${val(r.Cmd)}</div></div>
+            <div class="metric"><div class="label">🔄 Interval</div><div class="value">${val(r.Int)}</div></div>
+            <div class="metric"><div class="label">👁️ Last Seen</div><div class="value last-value">${humanLast(r.last_seen)}</div></div>
+            <div class="metric"><div class="label">📈 Packets / sec</div><div class="value">${rate(r.pps,"")}</div></div>
+            <div class="metric"><div class="label">🚫 Drops / sec</div><div class="value">${rate(r.dps,"")}</div></div>
+            <div class="metric"><div class="label">⚖️ Drop Ratio</div><div class="value">${rate(r.drop_ratio===null||r.drop_ratio===undefined?null:(r.drop_ratio*100).toFixed(1),"%")}</div></div>
+        </div>
+    </td>`; }
+const CELL_CLASSES=["caret-cell","addr-cell","text-center","td-num","td-num","td-num","td-num","last-cell"];
+function esc(s){ return String(s).replace(/[&<>"']/g, c=>`&#${c.charCodeAt(0)};`); }
+function cellValues(r, open){
+    const addr=r.addr||"", server=r.server!==undefined?`<span class="server-badge">@ ${r.server}</span>`:"";
+    // The hostname arrives with a later update, once the background lookup is done.
+    const host=r.hostname?`<span class="host-name">${esc(r.hostname)}</span>`:"";
+    return [open?"▲":"▼", `${iconForAddr(addr)}&nbsp; ${addr}${host}${server}`, sevLabel(severity(r)),
+            val(r.NTP), val(r.Drop), val(r.Cmd), val(r.Int), humanLast(r.last_seen)];
+}
+
+// The page's rows live in `rows`/`keys` and the `byKey` map; only the rows inside
+// the viewport (plus OVERSCAN pixels) have DOM nodes, between two spacer rows.
+// `tops` holds every row's offset; rendering patches only the cells that changed.
+const PAGE_SIZE=5000, OVERSCAN=600;
+let rows=[], keys=[], byKey=new Map(), tops=[0], rowH=41, detailH=150, rowMeasured=false, detailMeasured=false;
+let page=0, filtered=0, reqSeq=0, applied=0, renderedKey="", renderedEtag="", frame=0;
+const tbody=document.getElementById("client-tbody"), domRows=new Map();
+function spacerRow(){ const tr=document.createElement("tr"); tr.className="spacer-row"; tr.innerHTML='<td colspan="8"></td>'; tbody.appendChild(tr); return tr.firstChild; }
+const topSpacer=spacerRow(), bottomSpacer=spacerRow();
+
+function setRows(list){
+    rows=list; keys=rows.map(rowKey); byKey=new Map(keys.map((k,i)=>[k,rows[i]]));
+    layout(); renderWindow(); updateExpandToggleVisual();
+}
+function layout(){
+    tops=new Array(rows.length+1); tops[0]=0;
+    for(let i=0;i<rows.length;i++) tops[i+1]=tops[i]+rowH+(openSet.has(keys[i])?detailH:0);
+}
+function firstBelow(y){ let lo=0, hi=rows.length; while(lo<hi){ const m=(lo+hi)>>1; if(tops[m+1]<=y) lo=m+1; else hi=m; } return lo; }
+
+function patchRow(d, r, open){
+    if(d.row===r && d.open===open) return;
+    const vals=cellValues(r, open), cells=d.tr.cells;
+    for(let i=0;i<vals.length;i++){
+        if(d.vals[i]===vals[i]) continue;
+        if(i===1) cells[i].innerHTML=vals[i]; else cells[i].textContent=vals[i];
+    }
+    d.vals=vals;
+    const sev=severity(r);
+    if(d.sev!==sev){ d.tr.classList.remove("sev-"+d.sev); d.tr.classList.add("sev-"+sev); d.sev=sev; }
+    if(open){
+        if(!d.detail){ d.detail=document.createElement("tr"); d.detail.className="detail-row"; d.detail.dataset.detailFor=d.tr.dataset.key; }
+        if(d.row!==r || !d.open) d.detail.innerHTML=detailCells(r);
+    }else if(d.detail){ d.detail.remove(); d.detail=null; }
+    d.row=r; d.open=open;
+}
+function createRow(key){
+    const tr=document.createElement("tr"); tr.className="client-row"; tr.dataset.key=key;
+    for(const c of CELL_CLASSES){ const td=document.createElement("td"); td.className=c; tr.appendChild(td); }
+    tr.cells[1].title=key;
+    return {tr:tr, detail:null, vals:[], sev:-1, row:null, open:false};
+}
+
+function renderWindow(){
+    frame=0;
+    const base=tbody.getBoundingClientRect().top+window.scrollY, y=window.scrollY-base;
+    const first=firstBelow(y-OVERSCAN);
+    let end=first; const limit=y+window.innerHeight+OVERSCAN;
+    while(end<rows.length && tops[end]<limit) end++;
+
+    const want=new Set();
+    let prev=topSpacer.parentNode;
+    for(let i=first;i<end;i++){
+        const k=keys[i]; want.add(k);
+        let d=domRows.get(k); if(!d){ d=createRow(k); domRows.set(k,d); }
+        patchRow(d, rows[i], openSet.has(k));
+        if(prev.nextSibling!==d.tr) tbody.insertBefore(d.tr, prev.nextSibling);
+        prev=d.tr;
+        if(d.detail){ if(prev.nextSibling!==d.detail) tbody.insertBefore(d.detail, prev.nextSibling); prev=d.detail; }
+    }
+    for(const [k,d] of domRows){ if(!want.has(k)){ d.tr.remove(); if(d.detail) d.detail.remove(); domRows.delete(k); } }
+    topSpacer.style.height=tops[first]+"px";
+    bottomSpacer.style.height=(tops[rows.length]-tops[end])+"px";
+
+    // Row and detail heights are measured once (again after a resize) from real rows.
+    let relayout=false;
+    for(const d of domRows.values()){
+        if(!rowMeasured && d.tr.offsetHeight){ rowMeasured=true; relayout=relayout||Math.abs(d.tr.offsetHeight-rowH)>1; rowH=d.tr.offsetHeight; }
+        if(!detailMeasured && d.detail && d.detail.offsetHeight){ detailMeasured=true; relayout=relayout||Math.abs(d.detail.offsetHeight-detailH)>1; detailH=d.detail.offsetHeight; }
+        if(rowMeasured && (detailMeasured || !openSet.size)) break;
+    }
+    if(relayout){ layout(); schedule(); }
+}
+function schedule(){ if(!frame) frame=requestAnimationFrame(renderWindow); }
+
+function updateExpandToggleVisual(){ $("#expand-toggle").prop("checked", keys.length>0 && keys.every(k=>openSet.has(k))); }
+function toggleRow(key){
+    if(openSet.has(key)) openSet.delete(key); else openSet.add(key);
+    saveOpenSet(openSet); layout(); renderWindow(); updateExpandToggleVisual();
+}
+
+let clockSkew=0, utcOffset=null;
+function pad(n){ return String(n).padStart(2,"0"); }
+function syncClock(xhr){ const d=Date.parse(xhr.getResponseHeader("Date")||""); if(!isNaN(d)) clockSkew=d-Date.now(); }
+function tickAges(){
+    for(const d of domRows.values()){
+        if(!d.row) continue;
+        const age=humanLast(d.row.last_seen);
+        if(d.vals[7]!==age){ d.tr.cells[7].textContent=age; d.vals[7]=age; }
+        if(d.detail){ const el=d.detail.querySelector(".last-value"); if(el) el.textContent=age; }
+    }
+}
+function tickClock(){
+    if(utcOffset===null) return;
+    const t=new Date(Date.now()+clockSkew+utcOffset*1000);
+    $("#date-part").text(`${pad(t.getUTCDate())}-${pad(t.getUTCMonth()+1)}-${t.getUTCFullYear()}`);
+    $("#time-part").text(`${pad(t.getUTCHours())}:${pad(t.getUTCMinutes())}:${pad(t.getUTCSeconds())}`);
+}
+
+function updatePager(){
+    const from=filtered?page*PAGE_SIZE+1:0, to=Math.min(filtered,(page+1)*PAGE_SIZE);
+    $("#page-info").text(`${from}–${to} of ${filtered}`);
+    $("#page-prev").prop("disabled",page===0); $("#page-next").prop("disabled",to>=filtered);
+    $(".pager").toggle(filtered>PAGE_SIZE);
+}
+function currentQuery(){
+    const q={sort:$("#sort-select").val(), q:$("#search").val().trim(), offset:page*PAGE_SIZE, limit:PAGE_SIZE}, server=$("#server-select").val();
+    if(server) q.server=server;
+    return q;
+}
+
+// Summary, counters and pager for a /data or /stream payload; false when the page had to move.
+function applyMeta(p){
+    utcOffset=p.utc_offset||0; tickClock();
+    $("#clients-count").text(p.count||0);
+    updateServers(p.servers);
+    // A stale payload is the last good table, kept while collections fail.
+    $("#stale-note").toggle(!!p.stale).text(p.stale?`Showing data collected at ${p.collected_time} – ${p.error}`:"");
+    filtered=p.filtered||0;
+    if(page>0 && page*PAGE_SIZE>=filtered){ page=Math.max(0,Math.ceil(filtered/PAGE_SIZE)-1); requery(); return false; }
+    updateSummary(p.summary||{}); updatePager();
+    return true;
+}
+function applyPayload(p){
+    if(!applyMeta(p)) return;
+    setRows(p.clients_parsed||[]);
+}
+function applyChange(p){
+    if(!applyMeta(p)) return;
+    (p.removed||[]).forEach(k=>byKey.delete(k));
+    (p.changed||[]).concat(p.added||[]).forEach(r=>byKey.set(rowKey(r),r));
+    setRows((p.order||keys).map(k=>byKey.get(k)).filter(Boolean));
+}
+
+// Polls ask for the columnar format (one column list, one array per column).
+function rowsFromColumns(c){
+    if(!c || !c.columns) return c;
+    const n=c.data.length?c.data[0].length:0, rows=new Array(n);
+    for(let i=0;i<n;i++){ const r={}; c.columns.forEach((k,j)=>{ r[k]=c.data[j][i]; }); rows[i]=r; }
+    return rows;
+}
+function fromColumns(p){ ["clients_parsed","added","changed"].forEach(k=>{ if(p[k]) p[k]=rowsFromColumns(p[k]); }); return p; }
+
+function refresh(){
+    const q=Object.assign(currentQuery(),{format:"columns"}), key=$.param(q), seq=++reqSeq;
+    const headers=(key===renderedKey && renderedEtag)?{"If-None-Match":renderedEtag}:{};
+    $.ajax({url:"/data", data:q, dataType:"json", headers:headers, success:function(payload, status, xhr){
+        if(seq<applied) return; applied=seq;
+        syncClock(xhr); tickClock();
+        if(xhr.status===304 || !payload) return;
+        renderedKey=key; renderedEtag=xhr.getResponseHeader("ETag")||"";
+        applyPayload(fromColumns(payload));
+    }});
+}
+
+// Live updates come from /stream (Server-Sent Events); polling /data is the fallback.
+let stream=null, pollTimer=null, streamErrors=0;
+function openStream(){
+    if(stream) stream.close();
+    stream=new EventSource("/stream?"+$.param(currentQuery()));
+    stream.addEventListener("snapshot", e=>{ streamErrors=0; applyPayload(JSON.parse(e.data)); });
+    stream.addEventListener("change", e=>{ streamErrors=0; applyChange(JSON.parse(e.data)); });
+    stream.addEventListener("heartbeat", e=>{ const h=JSON.parse(e.data); clockSkew=h.server_time*1000-Date.now(); tickClock(); });
+    stream.onerror=()=>{ if(stream.readyState===EventSource.CLOSED || ++streamErrors>3){ stream.close(); stream=null; startPolling(); } };
+}
+function startPolling(){ if(!pollTimer){ refresh(); pollTimer=setInterval(refresh,1000); } }
+function requery(){ renderedEtag=""; if(stream) openStream(); else refresh(); }
+
+$(function(){
+    let searchTimer=null;
+    $("#client-tbody").on("click", "tr.client-row", function(e){
+        if($(e.target).closest("a,button,select,input,label").length) return;
+        toggleRow(this.dataset.key);
+    });
+    $("#expand-toggle").on("change", function(){
+        if(this.checked) keys.forEach(k=>openSet.add(k)); else openSet=new Set();
+        saveOpenSet(openSet); layout(); renderWindow(); updateExpandToggleVisual();
+    });
+    window.addEventListener("scroll", schedule, {passive:true});
+    window.addEventListener("resize", ()=>{ rowMeasured=detailMeasured=false; schedule(); });
+    $("#sort-select, #server-select").on("change",()=>{ page=0; requery(); });
+    $("#search").on("input",()=>{ clearTimeout(searchTimer); searchTimer=setTimeout(()=>{ page=0; requery(); },200); });
+    $("#page-prev").on("click",()=>{ if(page>0){ page--; requery(); window.scrollTo(0, $(".table-wrap").offset().top); } });
+    $("#page-next").on("click",()=>{ page++; requery(); window.scrollTo(0, $(".table-wrap").offset().top); });
+    if(window.EventSource) openStream(); else startPolling();
+    setInterval(()=>{ tickClock(); tickAges(); },1000);
+});
+"""
+
+@app.route("/")
+def dashboard():
+    return _send_asset(assets().page, "no-cache")
+
+# ASGI variant for an asyncio server (`uvicorn ticc-dash:asgi_app`): the
+# collector runs on the event loop with non-blocking chronyd I/O, /stream
+# connections are coroutines rather than threads, and all other routes run
+# the Flask app in the loop's default executor.
+_collect_async = fleet.collect_async if fleet else get_chrony_clients_async
+
+def _wsgi_environ(scope, body: bytes):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", ()):
+        key = name.decode("latin-1").upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def _call_wsgi(environ):
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    result = app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return started[0], started[1], body
+
+async def _asgi_flask(scope, receive, send):
+    body = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+        body.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    loop = asyncio.get_running_loop()
+    status, headers, data = await loop.run_in_executor(None, _call_wsgi, _wsgi_environ(scope, b"".join(body)))
+    await send({"type": "http.response.start", "status": int(status.split(" ", 1)[0]),
+                "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]})
+    await send({"type": "http.response.body", "body": data})
+
+async def _asgi_stream(scope, receive, send):
+    # /stream without a thread per connection; the events are the ones
+    # stream() sends, built in the executor and cached per view.
+    with app.request_context(_wsgi_environ(scope, b"")):
+        try:
+            view = _view_params()
+        except ValueError:
+            view = None
+    if view is None:
+        return await _asgi_flask(scope, receive, send)
+    loop = asyncio.get_running_loop()
+
+    async def push(chunk: str):
+        await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+
+    async def events():
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        snap = await collector.snapshot_async()
+        await push(await loop.run_in_executor(None, _stream_open, snap, view))
+        while True:
+            new = await collector.wait_for_change_async(snap, SSE_HEARTBEAT)
+            await push(await loop.run_in_executor(None, _stream_next, snap, new, view))
+            snap = new
+
+    async def disconnected():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    pump, watch = asyncio.ensure_future(events()), asyncio.ensure_future(disconnected())
+    try:
+        await asyncio.wait((pump, watch), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        pump.cancel()
+        watch.cancel()
+    if pump.done() and not pump.cancelled():
+        exc = pump.exception()
+        if exc is not None and not isinstance(exc, OSError):  # OSError: the client went away
+            raise exc
+
+async def asgi_app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                collector.start_async(_collect_async)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                collector.stop_async()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    # For servers without lifespan events.
+    collector.start_async(_collect_async)
+    if scope["path"] == "/stream" and scope["method"] == "GET":
+        await _asgi_stream(scope, receive, send)
+    else:
+        await _asgi_flask(scope, receive, send)
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# check_fleet.py
+#
+# Checks that fleet mode only publishes a new snapshot version when
+# something changes: polls one healthy and one slow fake chronyd (see
+# fake_chronyd.py) for a few rounds and fails if the version keeps moving
+# while neither table does.
+#
+#   python3 tools/check_fleet.py
+#   python3 tools/check_fleet.py --rounds 10 --delay 2.0 --async
+import argparse
+import asyncio
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from fake_chronyd import FakeChronyd, synthetic_clients  # noqa: E402
+
+app = importlib.import_module("ticc-dash")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Check that fleet snapshot versions stay put while nothing changes")
+    ap.add_argument("--rounds", type=int, default=6, help="collections after the first one")
+    ap.add_argument("--timeout", type=float, default=0.5, help="per-server budget of a collection")
+    ap.add_argument("--delay", type=float, default=1.2, help="reply delay of the slow server")
+    ap.add_argument("--async", dest="use_async", action="store_true", help="collect with collect_async()")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        healthy_path, slow_path = os.path.join(tmp, "healthy.sock"), os.path.join(tmp, "slow.sock")
+        healthy = FakeChronyd(synthetic_clients(200, seed=1), path=healthy_path).start()
+        slow = FakeChronyd(synthetic_clients(50, seed=2), path=slow_path, delay=args.delay).start()
+        try:
+            fleet = app.FleetPoller([app.ChronyServer(f"healthy=socket:{healthy_path}"),
+                                     app.ChronyServer(f"slow=socket:{slow_path}")], timeout=args.timeout)
+            collect = (lambda: asyncio.run(fleet.collect_async())) if args.use_async else fleet
+            state_dir = os.path.join(tmp, "state")
+            collector = app.SnapshotCollector(collect, state_dir=state_dir)
+            versions, errors = [], []
+            for _ in range(args.rounds + 1):
+                snap = collector.refresh(collect())
+                versions.append(snap.version)
+                errors.append(snap.servers[1]["error"])
+                time.sleep(0.2)
+        finally:
+            healthy.stop()
+            slow.stop()
+
+    print(f"versions: {versions}")
+    print(f"slow server errors: {sorted(set(errors))}")
+    if not all(errors):
+        sys.exit("FAIL: the slow server answered within its budget; raise --delay")
+    if len(set(versions)) != 1:
+        sys.exit("FAIL: the snapshot version moved while no table changed")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
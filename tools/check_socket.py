@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# check_socket.py
+#
+# Checks the native command-socket client against fake_chronyd.py: reads a
+# table with IPv4 and IPv6 clients, unset intervals (-128) and never-seen
+# clients (NO_HIT) that spans several 8-client pages, with the blocking and
+# the asyncio client, and fails on any row that does not come back as sent.
+#
+#   python3 tools/check_socket.py
+#   python3 tools/check_socket.py --clients 1000
+import argparse
+import asyncio
+import importlib
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from fake_chronyd import FakeChronyd, synthetic_clients  # noqa: E402
+
+app = importlib.import_module("ticc-dash")
+
+EDGE_CASES = [
+    {"addr": "192.0.2.1", "NTP": 0, "Drop": 0, "Int": None, "IntL": None, "Last": None, "Cmd": 5},
+    {"addr": "2001:db8::1", "NTP": 7, "Drop": 2, "Int": -3, "IntL": 4, "Last": 0, "Cmd": 0},
+    {"addr": "::ffff:198.51.100.7", "NTP": 0xFFFFFFFF, "Drop": 0, "Int": 127, "IntL": None, "Last": 3, "Cmd": 0},
+    {"addr": "fe80::1", "NTP": 1, "Drop": 1, "Int": None, "IntL": None, "Last": 0xFFFFFF00, "Cmd": 1},
+]
+
+
+def compare(sent, got):
+    """Differences between the rows given to the fake and the decoded ones."""
+    problems = []
+    if len(got) != len(sent):
+        problems.append(f"{len(got)} rows decoded, {len(sent)} sent")
+    for want, row in zip(sent, got):
+        for field, value in want.items():
+            have = row.get(field)
+            if field == "Last" and value is not None and have is not None:
+                # The fake ages Last like chronyd: allow the seconds the read took.
+                ok = 0 <= have - value <= 2
+            else:
+                ok = have == value
+            if not ok:
+                problems.append(f"{want['addr']}: {field} is {have!r}, sent {value!r}")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Check the command-socket client against a fake chronyd")
+    ap.add_argument("--clients", type=int, default=37, help="synthetic clients besides the edge cases")
+    args = ap.parse_args()
+
+    sent = EDGE_CASES + synthetic_clients(args.clients, seed=3)
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chronyd.sock")
+        with FakeChronyd(sent, path=path) as fake:
+            for name, read in (
+                ("blocking", lambda: app.ChronyCommandClient(path, timeout=2.0).client_accesses()),
+                ("asyncio", lambda: asyncio.run(app.ChronyCommandClient(path, timeout=2.0).client_accesses_async())),
+            ):
+                problems = compare(sent, read())
+                print(f"{name}: {len(sent)} clients, {fake.requests} requests so far, "
+                      f"{'OK' if not problems else f'{len(problems)} problems'}")
+                for p in problems[:20]:
+                    print(f"  {p}")
+                failed = failed or bool(problems)
+            leftovers = [f for f in os.listdir(tmp) if f != "chronyd.sock"]
+            if leftovers:
+                print(f"reply sockets left behind: {leftovers}")
+                failed = True
+    if failed:
+        sys.exit("FAIL")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
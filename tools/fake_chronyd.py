@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# fake_chronyd.py
+#
+# A stand-in for chronyd's command socket, good enough to exercise the
+# dashboard's native client without a real daemon:
+#
+#   python3 tools/fake_chronyd.py --socket /tmp/chronyd.sock --clients 5000
+#   TICC_BACKEND=socket TICC_CHRONY_SOCKET=/tmp/chronyd.sock python3 ticc-dash.py
+#
+# It only implements REQ_CLIENT_ACCESSES_BY_INDEX3 and follows the packet
+# layout of chrony's candm.h (protocol version 6). Over UDP it refuses the
+# request as unauthorised, as chronyd does for anything but its Unix socket.
+import argparse
+import ipaddress
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+PROTO_VERSION = 6
+PKT_TYPE_CMD_REQUEST = 1
+PKT_TYPE_CMD_REPLY = 2
+REQ_CLIENT_ACCESSES_BY_INDEX3 = 68
+RPY_NULL = 1
+RPY_CLIENT_ACCESSES_BY_INDEX3 = 21
+STT_SUCCESS = 0
+STT_UNAUTH = 2
+STT_INVALID = 3
+STT_BADPKTLENGTH = 19
+MAX_CLIENT_ACCESSES = 8
+INVALID_RATE = -128
+NO_HIT = 0xFFFFFFFF
+
+REQ_HEADER = struct.Struct("!BBBBHHIII")
+REQ_CLIENT_ACCESSES = struct.Struct("!IIII")
+RPY_HEADER = struct.Struct("!BBBBHHHHHHIII")
+RPY_CLIENT_ACCESSES = struct.Struct("!III")
+RPY_CLIENT = struct.Struct("!16sHxxIIIIIIbbbbIII")
+LAST_NTP_AGO = struct.Struct("!I")
+LAST_NTP_AGO_OFFSET = 48
+REPLY_LENGTH = RPY_HEADER.size + RPY_CLIENT_ACCESSES.size + MAX_CLIENT_ACCESSES * RPY_CLIENT.size
+
+
+def synthetic_clients(n, seed=0):
+    """Return ``n`` client rows (dashboard shape) with mixed IPv4/IPv6 addresses."""
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        if rnd.random() < 0.8:
+            addr = str(ipaddress.IPv4Address(0x0A000000 + i))
+        else:
+            addr = str(ipaddress.IPv6Address((0x20010DB8 << 96) + i))
+        drop = rnd.choice((0, 0, 0, 0, 1, 3, 12))
+        rows.append({
+            "addr": addr,
+            "NTP": rnd.randint(1, 100000),
+            "Drop": drop,
+            "Int": rnd.choice((None, 4, 6, 8, 10)),
+            "IntL": None,
+            "Last": rnd.randint(0, 200000),
+            "Cmd": rnd.choice((0, 0, 0, 2)),
+        })
+    return rows
+
+
+def _encode_client(row):
+    ip = ipaddress.ip_address(row["addr"])
+    family = 1 if ip.version == 4 else 2
+    raw = ip.packed.ljust(16, b"\0")
+
+    def rate(v):
+        return INVALID_RATE if v is None else int(v)
+
+    last = row.get("Last")
+    return RPY_CLIENT.pack(
+        raw, family,
+        int(row.get("NTP", 0)), 0, int(row.get("Cmd", 0)),
+        int(row.get("Drop", 0)), 0, 0,
+        rate(row.get("Int")), INVALID_RATE, INVALID_RATE, rate(row.get("IntL")),
+        NO_HIT if last is None else int(last), NO_HIT, NO_HIT,
+    )
+
+
+class FakeChronyd:
+    """Serve a client-access table over a Unix datagram socket (UDP gets
+    STT_UNAUTH, as from chronyd).
+
+    ``clients`` uses the dashboard's row shape ({"addr", "NTP", "Drop", ...}).
+    Like chronyd, it reports ``Last`` as of the request: the values given to
+    set_clients() grow by the seconds passed since. ``delay`` holds every
+    reply back, to simulate a slow or hung daemon.
+    """
+
+    def __init__(self, clients=(), path=None, host="127.0.0.1", port=0, delay=0.0):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._records = []
+        self._lasts = []
+        self._set_at = time.monotonic()
+        self.set_clients(clients)
+        self._sock = None
+        self._thread = None
+
+    def set_clients(self, clients):
+        records = [_encode_client(r) for r in clients]
+        lasts = [r.get("Last") for r in clients]
+        with self._lock:
+            self._records, self._lasts, self._set_at = records, lasts, time.monotonic()
+
+    @property
+    def address(self):
+        return self.path if self.path else self._sock.getsockname()
+
+    def start(self):
+        if self.path:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sock.bind(self.path)
+            os.chmod(self.path, 0o666)
+        else:
+            self._sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.bind((self.host, self.port))
+            self.port = self._sock.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, name="fake-chronyd", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            sock.close()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self.path and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _serve(self):
+        # stop() clears self._sock while a reply may be in flight, so keep
+        # our own reference; closing it makes recvfrom/sendto raise OSError.
+        sock = self._sock
+        while True:
+            try:
+                pkt, peer = sock.recvfrom(4096)
+            except OSError:
+                return
+            reply = self._handle(pkt)
+            if reply is None:
+                continue
+            if self.delay:
+                time.sleep(self.delay)
+            try:
+                sock.sendto(reply, peer)
+            except OSError:
+                pass
+
+    def _handle(self, pkt):
+        if len(pkt) < REQ_HEADER.size:
+            return None
+        version, pkt_type, _, _, command, _attempt, sequence, _, _ = REQ_HEADER.unpack_from(pkt)
+        if pkt_type != PKT_TYPE_CMD_REQUEST:
+            return None
+        self.requests += 1
+
+        def header(status, reply_code):
+            return RPY_HEADER.pack(PROTO_VERSION, PKT_TYPE_CMD_REPLY, 0, 0, command, reply_code,
+                                   status, 0, 0, 0, sequence, 0, 0)
+
+        if version != PROTO_VERSION or command != REQ_CLIENT_ACCESSES_BY_INDEX3:
+            return header(STT_INVALID, RPY_NULL)
+        if len(pkt) < REPLY_LENGTH:
+            return header(STT_BADPKTLENGTH, RPY_NULL)
+        if not self.path:
+            return header(STT_UNAUTH, RPY_NULL)
+        first, n_clients, _min_hits, _reset = REQ_CLIENT_ACCESSES.unpack_from(pkt, REQ_HEADER.size)
+        with self._lock:
+            records, lasts, set_at = self._records, self._lasts, self._set_at
+        n_clients = min(n_clients, MAX_CLIENT_ACCESSES)
+        page = records[first:first + n_clients]
+        elapsed = int(time.monotonic() - set_at)
+        if elapsed:
+            page = [rec if last is None else
+                    rec[:LAST_NTP_AGO_OFFSET] + LAST_NTP_AGO.pack(int(last) + elapsed) + rec[LAST_NTP_AGO_OFFSET + 4:]
+                    for rec, last in zip(page, lasts[first:first + n_clients])]
+        next_index = min(first + n_clients, len(records))
+        body = RPY_CLIENT_ACCESSES.pack(len(records), next_index, len(page)) + b"".join(page)
+        return (header(STT_SUCCESS, RPY_CLIENT_ACCESSES_BY_INDEX3) + body).ljust(REPLY_LENGTH, b"\0")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fake chronyd command socket")
+    where = ap.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", help="Unix datagram socket path")
+    where.add_argument("--udp", help="HOST:PORT for the UDP command port (answers unauthorised)")
+    ap.add_argument("--clients", type=int, default=100, help="number of synthetic clients")
+    ap.add_argument("--delay", type=float, default=0.0, help="seconds to hold back every reply")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    kw = {"path": args.socket} if args.socket else {}
+    if args.udp:
+        host, _, port = args.udp.rpartition(":")
+        kw.update(host=host.strip("[]"), port=int(port))
+    server = FakeChronyd(synthetic_clients(args.clients, args.seed), delay=args.delay, **kw).start()
+    print(f"fake chronyd serving {args.clients} clients on {server.address}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -79,7 +79,7 @@ echo "  • Port ${PORT}:          freed"
 echo
 echo "Verify:"
 echo "  • systemctl status $SERVICE_NAME"
-echo "  • pgrep -a gunicorn"
+echo "  • pgrep -af 'gunicorn|uvicorn'"
 echo "  • ss -lptn 'sport = :${PORT}'"
 echo "  • ls -la $APP_DIR"
 echo "=========================================="